@@ -23,18 +23,72 @@ to ensure that only authorized users can view or modify the high scores.
 
 This module should be used as part of a larger application that includes a game that generates high scores.
 """
-from flask import Flask, request, jsonify, render_template, abort, make_response
+from flask import Flask, Response, request, jsonify, render_template, abort, make_response, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
 import json
 from datetime import timedelta
+import csv
+import math
 import os
+import threading
+import time
 import password_store
-import bcrypt
+import player_stats
+from group_commit import GroupCommitWriter
+from rate_limit import RateLimiter
+import score_transfer
+from file_lock import FileLock
+from leaderboard_snapshot import SnapshotReader, build_snapshot, publish_snapshot, source_stamp, stat_stamp
 
 app = Flask(__name__)
 
+# Log at INFO by default, so the progress and row counts of imports and exports show up in the Gunicorn error
+# log. Without a level the logger inherits WARNING from the root logger. Set LOG_LEVEL=WARNING to quiet it.
+app.logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+# Number of reverse proxies in front of the app whose X-Forwarded-For header is trusted. Behind a proxy the
+# remote address is the proxy's, so without this every client would look the same to the rate limits.
+# Defaults to 1 on Render (which sets RENDER) and to 0 elsewhere, where the header could be forged.
+trusted_proxies = int(os.environ.get("TRUSTED_PROXIES", "1" if os.environ.get("RENDER") else "0"))
+if trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
+
 # Define the path to the high scores file
 high_scores_file = "high_scores.json"
 
+# Serialize writes to the high scores and player statistics files across the threads and the Gunicorn workers,
+# every worker loads, modifies and saves the files while holding the lock
+high_scores_lock = FileLock("high_scores.lock")
+
+# Group commit mode buffers POST /highscores requests and writes them in batches with one fsync per batch.
+# Enable it with HIGH_SCORES_GROUP_COMMIT=1, the batch is flushed when it holds HIGH_SCORES_BATCH_SIZE scores
+# or when the oldest score has waited HIGH_SCORES_MAX_DELAY_MS milliseconds.
+group_commit_enabled = os.environ.get("HIGH_SCORES_GROUP_COMMIT") == "1"
+group_commit_batch_size = int(os.environ.get("HIGH_SCORES_BATCH_SIZE", "100"))
+group_commit_max_delay = int(os.environ.get("HIGH_SCORES_MAX_DELAY_MS", "50")) / 1000
+group_commit_writer = None
+group_commit_writer_lock = threading.Lock()
+
+# The read routes serve the leaderboard from a memory-mapped binary snapshot shared by all workers,
+# which is published on every write
+snapshot_reader = SnapshotReader()
+
+# Rate limits of the API in requests per second, with a burst size, per client and for all clients together.
+# Reads and writes have separate budgets, so a client flooding POST /highscores does not starve the readers.
+# The buckets are kept in each process, so with several Gunicorn workers the effective limits are the
+# configured ones multiplied by the number of workers. Disable rate limiting with RATE_LIMIT_ENABLED=0.
+rate_limit_enabled = os.environ.get("RATE_LIMIT_ENABLED", "1") == "1"
+read_limiter = RateLimiter(
+    client_rate=float(os.environ.get("RATE_LIMIT_READ_RATE", "20")),
+    client_burst=float(os.environ.get("RATE_LIMIT_READ_BURST", "40")),
+    global_rate=float(os.environ.get("RATE_LIMIT_READ_GLOBAL_RATE", "1000")),
+    global_burst=float(os.environ.get("RATE_LIMIT_READ_GLOBAL_BURST", "2000")))
+write_limiter = RateLimiter(
+    client_rate=float(os.environ.get("RATE_LIMIT_WRITE_RATE", "1")),
+    client_burst=float(os.environ.get("RATE_LIMIT_WRITE_BURST", "5")),
+    global_rate=float(os.environ.get("RATE_LIMIT_WRITE_GLOBAL_RATE", "50")),
+    global_burst=float(os.environ.get("RATE_LIMIT_WRITE_GLOBAL_BURST", "100")))
+
 def load_high_scores(reverse=False):
     """
     Load and sort the high scores from the 'high_scores.json' file.
@@ -59,6 +113,136 @@ def load_high_scores(reverse=False):
 
     return high_scores
 
+def save_high_scores(high_scores):
+    """
+    Save the high scores to the 'high_scores.json' file durably.
+
+    The scores are written to a temporary file which is flushed to disk and then renamed over the
+    high scores file, so readers never see a partially written file. The leaderboard snapshot is built
+    first, so nothing is saved if the scores can't be published. The caller must hold high_scores_lock.
+
+    Args:
+        high_scores (list): A list of high score dictionaries.
+
+    Raises:
+        ValueError: If a high score can't be stored in the leaderboard snapshot.
+
+    """
+    snapshot = build_snapshot(high_scores)
+    # Every process writes its own temporary file, so Gunicorn workers don't overwrite each other's
+    temp_file = f"{high_scores_file}.{os.getpid()}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(high_scores, f)
+        f.flush()
+        os.fsync(f.fileno())
+        # The rename keeps the stamp, so it identifies exactly the contents the snapshot was built from
+        source = stat_stamp(os.fstat(f.fileno()))
+    version = time.time_ns()
+    os.replace(temp_file, high_scores_file)
+    # Publish the new leaderboard to the read routes, versioned by the time it was saved
+    publish_snapshot(snapshot, version, source)
+
+def get_leaderboard():
+    """
+    Get the latest leaderboard snapshot, publishing it from the high scores file if there is none yet
+    or if it was not built from the current high scores file.
+
+    Returns:
+        LeaderboardSnapshot: The memory-mapped leaderboard.
+
+    """
+    snapshot = snapshot_reader.current()
+    if snapshot is None or snapshot.source != source_stamp(high_scores_file):
+        with high_scores_lock:
+            # Take the version and the stamp before loading, so a write in between is published again
+            version = time.time_ns()
+            source = source_stamp(high_scores_file)
+            high_scores = load_high_scores()
+            publish_snapshot(build_snapshot(high_scores), version, source or source_stamp(high_scores_file))
+        snapshot = snapshot_reader.current()
+    return snapshot
+
+def commit_high_scores(new_scores):
+    """
+    Add new high scores to the high scores file in a single write.
+
+    Every new score is checked first, and an invalid score fails on its own without failing the other
+    scores of the batch. The player statistics are updated for every valid score, then the scores are
+    merged into the list, which is sorted, truncated to the top 50 and renumbered before it is saved once.
+
+    Args:
+        new_scores (list): A list of high score dictionaries with 'name' and 'time' fields.
+
+    Returns:
+        list: The result of each new high score, in the same order: its ID, None if it did not make it
+        to the top 50, or a ValueError if the score is not valid.
+
+    """
+    results = [None if player_stats.is_valid_score(score.get('name'), score.get('time'))
+               else ValueError(f"Invalid high score: {score!r}") for score in new_scores]
+    valid_scores = [score for score, result in zip(new_scores, results) if result is None]
+    if not valid_scores:
+        return results
+
+    with high_scores_lock:
+        # Load the existing high scores from the file
+        high_scores = load_high_scores()
+        # Update the players' running statistics before the scores can be truncated away
+        stats = player_stats.load_player_stats({score['name'] for score in valid_scores})
+        for score in valid_scores:
+            player_stats.update_player_stats(stats, score['name'], score['time'])
+        player_stats.save_player_stats(stats)
+        # Add the new high scores to the existing scores
+        high_scores.extend(valid_scores)
+        # Sort the high scores by time in ascending order
+        high_scores = sorted(high_scores, key=lambda x: x["time"])
+        # Truncate the list to the top 50 high scores
+        high_scores = high_scores[:50]
+        # Assign IDs to the high scores
+        for i, score in enumerate(high_scores):
+            score['id'] = i + 1
+
+        # Save the updated high scores to the local file
+        save_high_scores(high_scores)
+
+    # A score that did not make it to the top 50 has no ID
+    return [score.get('id') if result is None else result for score, result in zip(new_scores, results)]
+
+def get_group_commit_writer():
+    """
+    Get the group commit writer of this process, creating it on first use.
+
+    Returns:
+        GroupCommitWriter: The writer that commits buffered high scores with commit_high_scores().
+
+    """
+    global group_commit_writer
+    with group_commit_writer_lock:
+        if group_commit_writer is None:
+            group_commit_writer = GroupCommitWriter(commit_high_scores, group_commit_batch_size, group_commit_max_delay)
+    return group_commit_writer
+
+@app.before_request
+def limit_request_rate():
+    """
+    Reject requests of clients that are over their rate limit or when the whole API is over its limit.
+
+    POST and DELETE requests use the write budget and other requests the read budget.
+    Clients are identified by their IP address, taken from X-Forwarded-For behind trusted proxies.
+
+    Returns:
+        None if the request is admitted, otherwise a JSON error response with status code 429
+        (Too Many Requests) and a Retry-After header telling when to try again.
+    """
+    if not rate_limit_enabled:
+        return None
+    limiter = write_limiter if request.method in ("POST", "DELETE") else read_limiter
+    wait = limiter.acquire(request.remote_addr)
+    if wait:
+        # Return an error response with status code 429 (Too Many Requests)
+        return jsonify({"error": "Too many requests"}), 429, {"Retry-After": str(math.ceil(wait))}
+    return None
+
 @app.route('/highscores', methods=['GET'])
 def get_high_scores():
     """
@@ -89,22 +273,16 @@ def get_high_scores():
     # Get the values of the "sort" and "limit" query parameters
     sort_param = request.args.get("sort")
     limit_param = request.args.get("limit")
-    
-    # Load the high scores from the file, sorting in descending order if requested
-    if sort_param == "desc":
-        high_scores = load_high_scores(reverse=True)
-    else:
-        high_scores = load_high_scores()
 
     # Check if limit parameter is provided and valid
-    if limit_param and limit_param.isdigit():
+    if limit_param and limit_param.isdigit() and int(limit_param) > 0:
         limit = int(limit_param)
     else:
         limit = None
 
-    # Apply the limit if provided
-    if limit:
-        high_scores = high_scores[:limit]
+    # Read the high scores from the leaderboard snapshot, sorting in descending order if requested
+    # and applying the limit if provided
+    high_scores = get_leaderboard().scores(reverse=sort_param == "desc", limit=limit)
 
     # Return the high scores in JSON format
     return jsonify(high_scores)
@@ -128,18 +306,15 @@ def get_high_score(id):
     # Check if the provided password matches the pre-defined password
     if password != password_store.password:
         return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
-    # Load the high scores from the file
-    high_scores = load_high_scores()
-
-    # Search for the high score with the specified ID
-    for score in high_scores:
-        if score['id'] == id:
-            # Return the high score in HTML format
-            formatted_time = score['time']
-            if len(formatted_time) == 4:
-                formatted_time = "0" + formatted_time
-            high_score_formatted = [(score['id'], score['name'], formatted_time)]
-            return render_template('high_scores.html', high_scores=high_score_formatted)
+    # Search for the high score with the specified ID in the leaderboard snapshot
+    score = get_leaderboard().find(id)
+    if score is not None:
+        # Return the high score in HTML format
+        formatted_time = score['time']
+        if len(formatted_time) == 4:
+            formatted_time = "0" + formatted_time
+        high_score_formatted = [(score['id'], score['name'], formatted_time)]
+        return render_template('high_scores.html', high_scores=high_score_formatted)
 
     # If the high score with the specified ID doesn't exist, return a 404 error
     abort(404)
@@ -157,39 +332,44 @@ def add_high_score():
 
     JSON Payload:
         name: str - The name of the player.
-        time: float - The time in seconds for the high score.
+        time: str - The time of the high score in "MM:SS" format.
+
+    In group commit mode the score is buffered and the response is sent once the batch containing
+    it has been written to disk.
 
     Returns:
-        JSON response with the ID of the added high score.
+        JSON response with the ID of the added high score, or null as the ID if the score
+        did not make it to the top 50.
 
     Raises:
         HTTPException: A 401 Unauthorized error if the provided password is incorrect.
+        HTTPException: A 400 Bad Request error if the name or the time is not valid.
     """
     password = request.args.get("password") # Get the password from the query parameters
     # Check if the provided password matches the pre-defined password
     if password != password_store.password:
         return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
-    # Load the existing high scores from the file
-    high_scores = load_high_scores()
     # Get the name and time from the request body
-    name = request.json.get('name')
-    time = request.json.get('time')
-    # Add the new high score to the existing scores
-    high_scores.append({'name': name, 'time': time})
-    # Sort the high scores by time in ascending order
-    high_scores = sorted(high_scores, key=lambda x: x["time"])
-    # Truncate the list to the top 50 high scores
-    high_scores = high_scores[:50]
-    # Assign IDs to the high scores
-    for i, score in enumerate(high_scores):
-        score['id'] = i + 1
-
-    # Save the updated high scores to the local file
-    with open('high_scores.json', "w") as f:
-        json.dump(high_scores, f)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object with name and time"}), 400
+    name = payload.get('name')
+    time = payload.get('time')
+    # Check the score before anything is stored
+    if not player_stats.is_valid_score(name, time):
+        return jsonify({"error": "Invalid name or time, expected a name of 1-20 characters and a MM:SS time"}), 400
+    new_score = {'name': name, 'time': time}
+
+    # Add the new high score, either in a batch with other requests or on its own
+    if group_commit_enabled:
+        score_id = get_group_commit_writer().submit(new_score)
+    else:
+        score_id = commit_high_scores([new_score])[0]
+        if isinstance(score_id, Exception):
+            raise score_id
 
-    # Send the response to the client
-    return jsonify({'id': high_scores[-1]['id']})
+    # Send the response to the client, the ID is null if the score did not make it to the top 50
+    return jsonify({'id': score_id})
 
 @app.route('/highscores/<int:id>', methods=['DELETE'])
 def delete_high_score(id):
@@ -211,27 +391,191 @@ def delete_high_score(id):
     if password != password_store.password:
         return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
 
-    # Load the list of high scores from the JSON file
-    with open('high_scores.json', 'r') as f:
-        high_scores = json.load(f)
+    with high_scores_lock:
+        # Load the list of high scores from the JSON file
+        with open('high_scores.json', 'r') as f:
+            high_scores = json.load(f)
 
-    # Find the index of the high score with the specified ID
-    index = next((i for i, score in enumerate(high_scores) if score['id'] == id), None)
+        # Find the index of the high score with the specified ID
+        index = next((i for i, score in enumerate(high_scores) if score['id'] == id), None)
 
-    if index is not None:
-        # Remove the high score with the specified ID
-        del high_scores[index]
+        if index is not None:
+            # Remove the high score with the specified ID
+            del high_scores[index]
 
-        # Write the updated list of high scores back to the JSON file
-        with open('high_scores.json', 'w') as f:
-            json.dump(high_scores, f, indent=4)
+            # Write the updated list of high scores back to the JSON file
+            save_high_scores(high_scores)
 
+    if index is not None:
         # Return a successful response with a 204 No Content status code
         return make_response("", 204)
     else:
         # If the specified ID does not exist in the list of high scores, return a 404 Not Found error
         abort(404)
 
+@app.route('/highscores/export', methods=['GET'])
+def export_high_scores():
+    """
+    Export the high scores as a streamed CSV or NDJSON download.
+
+    The scores are decoded from the high scores file and encoded one at a time while the response is sent,
+    so the whole list is never held in memory. The number of exported rows is logged when the export ends.
+
+    Request Parameters:
+        password: str - A password to authenticate the request.
+        format: str - 'csv' or 'ndjson'. Defaults to 'ndjson'.
+
+    Returns:
+        A streamed response with the high scores.
+
+    Raises:
+        HTTPException: A 401 Unauthorized error if the provided password is incorrect.
+        HTTPException: A 400 Bad Request error if the format is not supported.
+    """
+    password = request.args.get("password") # Get the password from the query parameters
+    # Check if the provided password matches the pre-defined password
+    if password != password_store.password:
+        return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
+
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in score_transfer.FORMATS:
+        return jsonify({"error": "Unsupported format"}), 400
+    if not os.path.exists(high_scores_file):
+        with high_scores_lock:
+            # Another worker may have saved scores in the meantime
+            if not os.path.exists(high_scores_file):
+                save_high_scores([])
+
+    def generate():
+        rows = 0
+        def counted(scores):
+            nonlocal rows
+            for score in scores:
+                rows += 1
+                yield score
+        yield from score_transfer.export_chunks(counted(score_transfer.iter_high_scores(high_scores_file)), fmt)
+        app.logger.info("Exported %d high scores as %s", rows, fmt)
+
+    headers = {"Content-Disposition": f"attachment; filename=high_scores.{fmt}"}
+    return Response(stream_with_context(generate()), mimetype=score_transfer.FORMATS[fmt], headers=headers)
+
+@app.route('/highscores/import', methods=['POST'])
+def import_high_scores():
+    """
+    Import high scores from a streamed CSV or NDJSON upload.
+
+    The rows are validated while the upload is read and only the best 50 valid rows are kept in memory.
+    They are merged into the high scores, which are saved once at the end. A row with the same name and time
+    as a high score is not imported again. Imported scores are not counted in the player statistics, as
+    imports are used to restore backups. Progress is logged every 100000 rows.
+
+    Request Parameters:
+        password: str - A password to authenticate the request.
+        format: str - 'csv' or 'ndjson'. Defaults to 'csv' for a text/csv upload and to 'ndjson' otherwise.
+        mode: str - 'merge' to merge the rows into the high scores or 'replace' to replace the high scores
+            with them. Defaults to 'merge'.
+
+    Returns:
+        JSON response with the number of rows read, rows rejected as invalid and imported rows
+        that made it to the high scores.
+
+    Raises:
+        HTTPException: A 401 Unauthorized error if the provided password is incorrect.
+        HTTPException: A 400 Bad Request error if the format or the mode is not supported or the upload is not UTF-8.
+    """
+    password = request.args.get("password") # Get the password from the query parameters
+    # Check if the provided password matches the pre-defined password
+    if password != password_store.password:
+        return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
+
+    fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+    if fmt not in score_transfer.FORMATS:
+        return jsonify({"error": "Unsupported format"}), 400
+    mode = request.args.get("mode", "merge")
+    if mode not in ("merge", "replace"):
+        return jsonify({"error": "Unsupported mode"}), 400
+
+    # Read the upload line by line as it arrives
+    lines = score_transfer.iter_lines(request.stream)
+    counts = {}
+    def progress(counts):
+        app.logger.info("Importing high scores: %d rows read, %d rejected", counts['rows'], counts['rejected'])
+    try:
+        new_scores = score_transfer.best_imported_scores(lines, fmt, counts, progress)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": f"Invalid upload: {e}"}), 400
+
+    # Merge the imported scores and save the high scores once
+    with high_scores_lock:
+        high_scores, imported = score_transfer.merge_scores(load_high_scores(), new_scores, replace=mode == "replace")
+        save_high_scores(high_scores)
+
+    app.logger.info("Imported %d high scores from %d rows, %d rejected", imported, counts['rows'], counts['rejected'])
+    return jsonify({"rows": counts['rows'], "rejected": counts['rejected'], "imported": imported})
+
+@app.route('/highscores/stats', methods=['GET'])
+def get_all_player_stats():
+    """
+    Retrieve the aggregate statistics of all players.
+
+    The statistics are maintained incrementally on every submission, so nothing is recomputed here.
+
+    Returns:
+        A JSON response containing the statistics of every player, sorted by best time.
+
+    Raises:
+        HTTPException: A 401 Unauthorized error if the provided password is incorrect.
+    """
+    password = request.args.get("password") # Get the password from the query parameters
+    # Check if the provided password matches the pre-defined password
+    if password != password_store.password:
+        return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
+
+    return jsonify(player_stats.get_player_stats())
+
+@app.route('/highscores/stats/<name>', methods=['GET'])
+def get_one_player_stats(name):
+    """
+    Retrieve the aggregate statistics of a single player.
+
+    Args:
+        name (str): The name of the player.
+
+    Returns:
+        A JSON response containing the count, best, mean and median time and the recent trend of the player.
+
+    Raises:
+        HTTPException: A 401 Unauthorized error if the provided password is incorrect.
+        HTTPException: A 404 Not Found error if the player has no statistics.
+    """
+    password = request.args.get("password") # Get the password from the query parameters
+    # Check if the provided password matches the pre-defined password
+    if password != password_store.password:
+        return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
+
+    stats = player_stats.get_player_stats(name)
+    if stats is None:
+        abort(404)
+    return jsonify(stats)
+
+@app.route('/stats', methods=['GET'])
+def display_player_stats():
+    """
+    Display the aggregate statistics of all players on an HTML page, with a password protection mechanism.
+
+    Returns:
+        str: The rendered HTML page with the player statistics.
+
+    Raises:
+        HTTPException: A 401 Unauthorized error if the provided password is incorrect.
+    """
+    password = request.args.get("password") # Get the password from the query parameters
+    # Check if the provided password matches the pre-defined password
+    if password != password_store.password:
+        return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
+
+    return render_template('player_stats.html', player_stats=player_stats.get_player_stats())
+
 @app.route('/', methods=['GET'])
 def display_high_scores():
     """
@@ -247,30 +591,19 @@ def display_high_scores():
     # Check if the provided password matches the pre-defined password
     if password != password_store.password:
         return jsonify({"error": "Invalid password"}), 401 # Return an error response with status code 401 (Unauthorized)
-    # Load the high scores from the high_scores_file
-    sorted_scores = load_high_scores()
-    # Check if there are any high scores
-    # If there are no high scores, return empty list
-    if not sorted_scores:
-        high_scores_formatted = []
-
     # Get the values of the "sort" and "limit" query parameters
     sort_param = request.args.get("sort")
     limit_param = request.args.get("limit")
-    
-    # Sort the high scores in descending order if requested
-    if sort_param == "desc":
-        sorted_scores = sorted(sorted_scores, key=lambda x: x['time'], reverse=True)
 
     # Check if limit parameter is provided and valid
-    if limit_param and limit_param.isdigit():
+    if limit_param and limit_param.isdigit() and int(limit_param) > 0:
         limit = int(limit_param)
     else:
         limit = None
 
-    # Apply the limit if provided
-    if limit:
-        sorted_scores = sorted_scores[:limit]
+    # Read the high scores from the leaderboard snapshot, sorting in descending order if requested
+    # and applying the limit if provided
+    sorted_scores = get_leaderboard().scores(reverse=sort_param == "desc", limit=limit)
 
     high_scores_sorted = [(score['id'], score['name'], score['time']) for score in sorted_scores]
 
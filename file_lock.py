@@ -0,0 +1,53 @@
+"""
+File lock module.
+
+This module provides a lock that serializes a critical section across the threads of a process and across
+processes, such as the Gunicorn workers of the backend. Threads of a process take an in-process lock first,
+and the holder then takes an exclusive flock on a lock file, which the other processes wait for.
+
+flock is not available on Windows, where the lock only covers the threads of one process. That is enough for
+running the backend locally with the Flask development server.
+"""
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class FileLock:
+    """
+    A lock shared by the threads of a process and by all processes using the same lock file.
+
+    The lock file is opened on every acquire, so a relative path is resolved against the current directory
+    like the files the lock protects.
+
+    Args:
+        path (str): The path of the lock file. It is created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.Lock()
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is None:
+            return self
+        try:
+            self.file = open(self.path, 'a')
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.file is not None:
+            # Closing the file releases the flock
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
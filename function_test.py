@@ -1,5 +1,22 @@
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
 import unittest
 from hangman import *
+import app
+import game_log
+import load_test
+import player_stats
+import score_transfer
+import word_index
+from group_commit import GroupCommitWriter
+from leaderboard_snapshot import SnapshotReader, build_snapshot, publish_snapshot
+from rate_limit import RateLimiter
 
 class TestHangman(unittest.TestCase):
     def test_is_valid_guess(self):
@@ -35,5 +52,481 @@ class TestHangman(unittest.TestCase):
         self.assertFalse(is_name("invalid name"))
         self.assertFalse(is_name("$user"))
       
+class TestPlayerStats(unittest.TestCase):
+    def test_median_sketch(self):
+        # Exact median while there are fewer than five observations
+        sketch = player_stats.new_median_sketch()
+        for x in [30, 10, 20]:
+            player_stats.update_median_sketch(sketch, x)
+        self.assertEqual(player_stats.median_estimate(sketch), 20)
+
+        # Streaming estimate stays close to the true median
+        rng = random.Random(1)
+        values = [rng.randint(10, 300) for _ in range(2000)]
+        sketch = player_stats.new_median_sketch()
+        for x in values:
+            player_stats.update_median_sketch(sketch, x)
+        true_median = sorted(values)[len(values) // 2]
+        self.assertAlmostEqual(player_stats.median_estimate(sketch), true_median, delta=15)
+
+    def test_time_to_seconds(self):
+        self.assertEqual(player_stats.time_to_seconds("01:05"), 65)
+        for time_str in ["1:05:00", "100:00", "-1:00", "00:60", None]:
+            with self.assertRaises(ValueError):
+                player_stats.time_to_seconds(time_str)
+        self.assertTrue(player_stats.is_valid_score("Joonas", "00:40"))
+        self.assertFalse(player_stats.is_valid_score("", "00:40"))
+        self.assertFalse(player_stats.is_valid_score("a" * 21, "00:40"))
+        self.assertFalse(player_stats.is_valid_score("Joonas", 40))
+
+    def test_update_player_stats(self):
+        stats = {}
+        for time_str in ["01:00", "00:40", "00:50"]:
+            player_stats.update_player_stats(stats, "Joonas", time_str)
+        summary = player_stats.summarize_player("Joonas", stats["Joonas"])
+        self.assertEqual(summary["count"], 3)
+        self.assertEqual(summary["best"], "00:40")
+        self.assertEqual(summary["mean"], "00:50")
+        self.assertEqual(summary["median"], "00:50")
+
+        # Only the latest scores are kept for the trend
+        for _ in range(player_stats.RECENT_WINDOW):
+            player_stats.update_player_stats(stats, "Joonas", "00:20")
+        summary = player_stats.summarize_player("Joonas", stats["Joonas"])
+        self.assertEqual(summary["recent_mean"], "00:20")
+        self.assertLess(summary["trend"], 0)
+
+    def test_per_player_files(self):
+        player_stats_dir = player_stats.player_stats_dir
+        with tempfile.TemporaryDirectory() as stats_dir:
+            player_stats.player_stats_dir = stats_dir
+            try:
+                stats = {}
+                for name in ["Joonas", "../Masi/ä"]:
+                    player_stats.update_player_stats(stats, name, "00:40")
+                player_stats.save_player_stats(stats)
+
+                # Updating a player only rewrites the file of the player
+                joonas = player_stats.load_player_stats(["Joonas", "Nobody"])
+                self.assertEqual(list(joonas), ["Joonas"])
+                player_stats.update_player_stats(joonas, "Joonas", "00:20")
+                player_stats.save_player_stats(joonas)
+                self.assertEqual(len(os.listdir(stats_dir)), 2)
+                summaries = {summary["name"]: summary for summary in player_stats.get_player_stats()}
+                self.assertEqual(summaries["Joonas"]["count"], 2)
+                self.assertEqual(summaries["../Masi/ä"]["count"], 1)
+                self.assertEqual(player_stats.get_player_stats("Joonas")["best"], "00:20")
+            finally:
+                player_stats.player_stats_dir = player_stats_dir
+
+class TestGroupCommit(unittest.TestCase):
+    def test_batches_concurrent_submissions(self):
+        batches = []
+        def commit(entries):
+            batches.append(entries)
+            return [entry * 2 for entry in entries]
+
+        writer = GroupCommitWriter(commit, max_batch_size=10, max_delay=0.5)
+        results = {}
+        def submit(i):
+            results[i] = writer.submit(i)
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every submitter gets its own result and the full batch is committed at once
+        self.assertEqual(results, {i: i * 2 for i in range(10)})
+        self.assertEqual(len(batches), 1)
+
+    def test_entry_error_fails_only_its_submitter(self):
+        def commit(entries):
+            return [ValueError(entry) if entry < 0 else entry for entry in entries]
+
+        writer = GroupCommitWriter(commit, max_batch_size=2, max_delay=0.5)
+        results = {}
+        def submit(entry):
+            try:
+                results[entry] = writer.submit(entry)
+            except ValueError:
+                results[entry] = "error"
+        threads = [threading.Thread(target=submit, args=(entry,)) for entry in [1, -1]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {1: 1, -1: "error"})
+
+    def test_commit_error_is_raised_to_submitter(self):
+        def commit(entries):
+            raise OSError("disk full")
+
+        writer = GroupCommitWriter(commit, max_batch_size=10, max_delay=0.01)
+        with self.assertRaises(OSError):
+            writer.submit(1)
+
+class TestGameLog(unittest.TestCase):
+    def test_aggregates(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            # Two games, the tiny segment size makes the second game start a new segment
+            first = game_log.GameEventLog(log_dir, max_segment_size=1)
+            first.record(0, 1, "D", True)
+            first.record(0, 1, "X", False)
+            first.record(1, 2, "A", True)
+            second = game_log.GameEventLog(log_dir, max_segment_size=1)
+            second.record(1, 1, "E", False)
+            self.assertEqual(len(game_log.segment_paths(log_dir)), 2)
+
+            hardest = game_log.hardest_words(["DOG", "CAT"], log_dir)
+            self.assertEqual(hardest, [("DOG", 2, 0.5), ("CAT", 2, 0.5)])
+            rates = game_log.letter_hit_rates(log_dir)
+            self.assertEqual(rates["D"], (1, 1.0))
+            self.assertEqual(rates["E"], (1, 0.0))
+            self.assertEqual(sorted(game_log.time_per_round(log_dir)), [1, 2])
+
+    def test_partial_writes(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            # A record cut in the middle makes the next game start a new, aligned segment
+            first = game_log.GameEventLog(log_dir)
+            first.record(0, 1, "D", True)
+            with open(first.path, 'ab') as f:
+                f.write(b"\x01\x02\x03")
+            second = game_log.GameEventLog(log_dir)
+            self.assertNotEqual(second.path, first.path)
+            second.record(1, 1, "E", False)
+            # A segment with only part of a header is skipped, and the next game starts a new segment
+            with open(os.path.join(log_dir, "events-00000003.bin"), 'wb') as f:
+                f.write(game_log.MAGIC[:4])
+            third = game_log.GameEventLog(log_dir)
+            self.assertTrue(third.path.endswith("events-00000004.bin"))
+            third.record(1, 1, "T", True)
+
+            rates = game_log.letter_hit_rates(log_dir)
+            self.assertEqual(rates, {"D": (1, 1.0), "E": (1, 0.0), "T": (1, 1.0)})
+
+    def test_values_out_of_range_stop_logging(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            # A word ID or a round that does not fit the record stops logging the game without an error
+            for word_id, round_number in [(70000, 1), (1, 200)]:
+                log = game_log.GameEventLog(log_dir)
+                log.record(word_id, round_number, "A", True)
+                log.record(1, 1, "B", True)
+                self.assertIsNone(log.path)
+            self.assertEqual(game_log.letter_hit_rates(log_dir), {})
+
+class TestLoadTest(unittest.TestCase):
+    def test_parse_http_file(self):
+        scenarios = load_test.load_scenarios("test.http")
+        self.assertEqual(len(scenarios), 6)
+        self.assertEqual(scenarios[3].method, "GET")
+        self.assertEqual(scenarios[3].path, "/?sort=asc&limit=3&password=hirttoukko")
+        self.assertEqual(scenarios[5].method, "POST")
+        self.assertEqual(scenarios[5].headers, {"content-type": "application/json"})
+        self.assertEqual(json.loads(scenarios[5].body), {"name": "Joonas", "time": "00:40"})
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(load_test.percentile(values, 50), 50)
+        self.assertEqual(load_test.percentile(values, 99), 99)
+        self.assertIsNone(load_test.percentile([], 50))
+
+class TestRateLimiter(unittest.TestCase):
+    def test_client_and_global_limits(self):
+        limiter = RateLimiter(client_rate=1, client_burst=2, global_rate=1, global_burst=3)
+        # Each client gets its burst until the global bucket runs out
+        self.assertEqual(limiter.acquire("a"), 0)
+        self.assertEqual(limiter.acquire("a"), 0)
+        self.assertGreater(limiter.acquire("a"), 0)
+        self.assertEqual(limiter.acquire("b"), 0)
+        self.assertGreater(limiter.acquire("b"), 0)
+
+    def test_evicts_idle_clients(self):
+        limiter = RateLimiter(client_rate=1000, client_burst=1, global_rate=1000, global_burst=1000, max_clients=2)
+        for client in ["a", "b", "c"]:
+            limiter.acquire(client)
+        self.assertLessEqual(len(limiter.clients), 2)
+        self.assertIn("c", limiter.clients)
+
+class TestScoreTransfer(unittest.TestCase):
+    def test_iter_high_scores(self):
+        # A tiny chunk size makes every score span several chunks
+        with open("high_scores.json") as f:
+            expected = json.load(f)
+        self.assertEqual(list(score_transfer.iter_high_scores("high_scores.json", chunk_size=7)), expected)
+
+    def test_import_keeps_best_valid_rows(self):
+        upload = io.BytesIO("id,name,time\n1,Äijä,00:05\n2,,00:01\n3,Slow,99:59\n4,Bad,1:2\n5,Long,100:00\n"
+                            "6,Äijä,00:05\n7,Old,00:10\n".encode('utf-8'))
+        counts = {}
+        scores = score_transfer.best_imported_scores(score_transfer.iter_lines(upload, chunk_size=3), "csv", counts)
+        self.assertEqual(counts, {'rows': 7, 'rejected': 3})
+        self.assertEqual(scores, [{'name': 'Äijä', 'time': '00:05'}, {'name': 'Old', 'time': '00:10'},
+                                  {'name': 'Slow', 'time': '99:59'}])
+
+        # The score that is already on the leaderboard is not added again
+        merged, imported = score_transfer.merge_scores([{'id': 1, 'name': 'Old', 'time': '00:10'}], scores)
+        self.assertEqual([(score['id'], score['name']) for score in merged], [(1, 'Äijä'), (2, 'Old'), (3, 'Slow')])
+        self.assertEqual(imported, 2)
+        replaced, imported = score_transfer.merge_scores([{'id': 1, 'name': 'Gone', 'time': '00:01'}], scores,
+                                                         replace=True)
+        self.assertEqual([score['name'] for score in replaced], ['Äijä', 'Old', 'Slow'])
+        self.assertEqual(imported, 3)
+
+        # Repeated scores on the leaderboard are kept, only repeated new scores are left out
+        board = [{'id': 1, 'name': 'Joonas', 'time': '00:40'}, {'id': 2, 'name': 'Joonas', 'time': '00:40'}]
+        merged, imported = score_transfer.merge_scores(board, [{'name': 'Joonas', 'time': '00:40'},
+                                                               {'name': 'X', 'time': '00:40'},
+                                                               {'name': 'X', 'time': '00:40'}])
+        self.assertEqual([(score['id'], score['name']) for score in merged], [(1, 'Joonas'), (2, 'Joonas'), (3, 'X')])
+        self.assertEqual(imported, 1)
+
+    def test_best_unique_scores(self):
+        # Many more scores than the limit, every one of them repeated
+        scores = [{'name': f"P{i % 70}", 'time': f"{i % 70:02d}:00"} for i in range(700)]
+        best = score_transfer.best_unique_scores(scores, limit=50)
+        self.assertEqual([score['name'] for score in best], [f"P{i}" for i in range(50)])
+
+    def test_export_chunks(self):
+        scores = [{'id': 1, 'name': 'Joonas', 'time': '00:13'}]
+        self.assertEqual("".join(score_transfer.export_chunks(scores, "csv")), "id,name,time\r\n1,Joonas,00:13\r\n")
+        self.assertEqual(json.loads("".join(score_transfer.export_chunks(scores, "ndjson"))), scores[0])
+
+class TestLeaderboardSnapshot(unittest.TestCase):
+    def test_publish_and_swap(self):
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            path = os.path.join(snapshot_dir, "high_scores.snapshot")
+            reader = SnapshotReader(path)
+            self.assertIsNone(reader.current())
+            # A file in an older format is not used
+            with open(path, 'wb') as f:
+                f.write(b"HANGSNP1" + bytes(24))
+            self.assertIsNone(reader.current())
+
+            publish_snapshot(build_snapshot([{'id': 2, 'name': 'Masi', 'time': '00:15'},
+                                             {'id': 1, 'name': 'Äijä', 'time': '00:13'}]), 1, (10, 20, 30), path)
+            first = reader.current()
+            self.assertEqual((first.version, first.source), (1, (10, 20, 30)))
+            self.assertEqual(first.scores(), [{'id': 1, 'name': 'Äijä', 'time': '00:13'}, {'id': 2, 'name': 'Masi', 'time': '00:15'}])
+            self.assertEqual(first.scores(reverse=True, limit=1), [{'id': 2, 'name': 'Masi', 'time': '00:15'}])
+            self.assertEqual(first.find(2)['name'], 'Masi')
+            self.assertIsNone(first.find(3))
+            self.assertIs(reader.current(), first)
+
+            # A new version is mapped while the old mapping stays readable
+            self.assertTrue(publish_snapshot(build_snapshot([{'id': 1, 'name': 'Joonas', 'time': '00:10'}]), 3, None, path))
+            second = reader.current()
+            self.assertIsNot(second, first)
+            self.assertEqual(second.scores(), [{'id': 1, 'name': 'Joonas', 'time': '00:10'}])
+            self.assertEqual(first.find(1)['name'], 'Äijä')
+
+            # An older version is not published over a newer one, nor swapped in if it was
+            self.assertFalse(publish_snapshot(build_snapshot([]), 2, None, path))
+            os.remove(path)
+            publish_snapshot(build_snapshot([]), 2, None, path)
+            self.assertIs(reader.current(), second)
+            self.assertEqual(SnapshotReader(path).current().version, 2)
+
+    def test_invalid_scores_are_not_built(self):
+        with self.assertRaises(ValueError):
+            build_snapshot([{'id': -1, 'name': 'Joonas', 'time': '00:10'}])
+        with self.assertRaises(ValueError):
+            build_snapshot([{'id': 1, 'name': None, 'time': '00:10'}])
+        # A time that is not "MM:SS" is still served
+        snapshot = build_snapshot([{'id': 1, 'name': 'Joonas', 'time': '100:00'}])
+        self.assertEqual(len(snapshot), 56 + 20 + len('Joonas100:00'))
+
+class TestWordIndex(unittest.TestCase):
+    def test_features(self):
+        self.assertEqual(word_index.expected_misses("CAT", ["A", "E", "T", "C"]), 1)
+        self.assertEqual(word_index.letter_entropy("AAAA"), 0)
+        self.assertEqual(word_index.letter_entropy("AB"), 1)
+        self.assertEqual(word_index.letters_of("BLACK BEAR"), "BLACKBEAR")
+
+    def test_cache_and_selection(self):
+        with tempfile.TemporaryDirectory() as index_dir:
+            words_path = os.path.join(index_dir, "words.txt")
+            index_path = os.path.join(index_dir, "words_index.json")
+            with open(words_path, "w") as f:
+                f.write("\n".join(["DOG", "CAT", "ELEPHANT", "TIGER", "LION", "KOMODO DRAGON"]))
+            index = word_index.load_word_index(words_path, index_path)
+            self.assertEqual(sorted(sum(index["tiers"].values(), [])), list(range(6)))
+
+            # The cached index is used until the word list changes
+            with open(index_path, "w") as f:
+                json.dump(dict(index, cached=True), f)
+            self.assertTrue(word_index.load_word_index(words_path, index_path).get("cached"))
+            with open(words_path, "a") as f:
+                f.write("\nFOX")
+            self.assertEqual(len(word_index.load_word_index(words_path, index_path)["words"]), 7)
+
+            # A corrupt cache is rebuilt, and an index that can't be cached is still used
+            for corrupt in [b'{"words": [', b'\xff\xfe', b'[]']:
+                with open(index_path, "wb") as f:
+                    f.write(corrupt)
+                self.assertEqual(len(word_index.load_word_index(words_path, index_path)["words"]), 7)
+            os.remove(index_path)
+            os.mkdir(index_path)
+            self.assertEqual(len(word_index.load_word_index(words_path, index_path)["words"]), 7)
+            self.assertEqual(sorted(os.listdir(index_dir)), ["words.txt", "words_index.json"])
+
+        tiers = [index["tiers"][tier] for tier in word_index.TIERS]
+        progressive = word_index.select_words(index, "progressive")
+        self.assertEqual([next(n for n, tier in enumerate(tiers) if i in tier) for i in progressive], [0, 1, 2])
+        balanced = word_index.select_words(index, "balanced")
+        self.assertEqual(sorted(next(n for n, tier in enumerate(tiers) if i in tier) for i in balanced), [0, 1, 2])
+        self.assertEqual(len(set(word_index.select_words(index, "random"))), 3)
+        with self.assertRaises(ValueError):
+            word_index.select_words(index, "hardest")
+
+def commit_scores(prefix, count):
+    # Commit scores one at a time, run in a separate process like a Gunicorn worker
+    for i in range(count):
+        app.commit_high_scores([{'name': f"{prefix}{i}", 'time': f"00:{i:02d}"}])
+
+class TestApp(unittest.TestCase):
+    def setUp(self):
+        # Run the backend in an empty directory with rate limiting off
+        self.old_cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        self.rate_limit_enabled = app.rate_limit_enabled
+        app.rate_limit_enabled = False
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        app.rate_limit_enabled = self.rate_limit_enabled
+        os.chdir(self.old_cwd)
+        self.temp_dir.cleanup()
+
+    def post_score(self, name, time):
+        return self.client.post('/highscores?password=hirttoukko', json={'name': name, 'time': time})
+
+    def test_invalid_scores_are_rejected(self):
+        for name, time in [("Joonas", "1:05:00"), ("Joonas", None), (None, "00:30"), ("Joonas", "-1:00")]:
+            self.assertEqual(self.post_score(name, time).status_code, 400)
+        response = self.client.post('/highscores?password=hirttoukko', data="not json", content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        # Nothing was stored
+        self.assertFalse(os.path.exists(player_stats.player_stats_dir))
+        self.assertEqual(self.client.get('/highscores?password=hirttoukko').json, [])
+
+    def test_group_commit(self):
+        group_commit_enabled = app.group_commit_enabled
+        app.group_commit_enabled = True
+        try:
+            responses = {}
+            def post(i):
+                responses[i] = app.app.test_client().post('/highscores?password=hirttoukko',
+                                                          json={'name': f"P{i}", 'time': f"00:3{i}"})
+            threads = [threading.Thread(target=post, args=(i,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            app.group_commit_enabled = group_commit_enabled
+
+        # Every request gets the ID of its own score
+        self.assertEqual({i: response.json['id'] for i, response in responses.items()}, {0: 1, 1: 2, 2: 3, 3: 4})
+
+    def test_commit_high_scores(self):
+        # An invalid score in a batch fails alone
+        results = app.commit_high_scores([{'name': "Good", 'time': "00:30"}, {'name': "Bad", 'time': "bad"},
+                                          {'name': "Fast", 'time': "00:10"}])
+        self.assertEqual(results[0], 2)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], 1)
+        self.assertEqual(len(self.client.get('/highscores?password=hirttoukko').json), 2)
+
+        # A score that does not make it to the top 50 has no ID
+        app.commit_high_scores([{'name': f"P{i}", 'time': "00:20"} for i in range(50)])
+        self.assertEqual(self.post_score("Slow", "59:59").json, {'id': None})
+        self.assertEqual(self.post_score("Faster", "00:15").json, {'id': 2})
+
+    def test_rate_limit_per_forwarded_client(self):
+        wsgi_app, write_limiter = app.app.wsgi_app, app.write_limiter
+        app.app.wsgi_app = app.ProxyFix(wsgi_app, x_for=1)
+        app.write_limiter = RateLimiter(client_rate=0.001, client_burst=1, global_rate=1000, global_burst=1000)
+        app.rate_limit_enabled = True
+        try:
+            def post(client):
+                return self.client.post('/highscores?password=hirttoukko', json={'name': "Joonas", 'time': "00:30"},
+                                        headers={'X-Forwarded-For': client})
+            # Clients behind the same proxy have their own buckets
+            self.assertEqual(post("10.0.0.1").status_code, 200)
+            self.assertEqual(post("10.0.0.1").status_code, 429)
+            self.assertEqual(post("10.0.0.2").status_code, 200)
+        finally:
+            app.app.wsgi_app, app.write_limiter = wsgi_app, write_limiter
+
+    def test_leaderboard_follows_high_scores_file(self):
+        self.post_score("Joonas", "00:13")
+        # The snapshot is stamped with the file it was built from, so it is not published again on read
+        snapshot = app.get_leaderboard()
+        self.assertEqual(snapshot.source, app.source_stamp(app.high_scores_file))
+        self.assertIs(app.get_leaderboard(), snapshot)
+        # A score that can't be published leaves the high scores file as it was
+        with self.assertRaises(ValueError):
+            app.save_high_scores([{'id': -1, 'name': "Bad", 'time': "-1:00"}])
+        with open(app.high_scores_file) as f:
+            self.assertEqual(json.load(f), [{'id': 1, 'name': "Joonas", 'time': "00:13"}])
+
+        # The leaderboard is published again when the file is changed without publishing
+        with open(app.high_scores_file, 'w') as f:
+            json.dump([{'id': 1, 'name': "Masi", 'time': "00:15"}], f)
+        self.assertEqual(self.client.get('/highscores?password=hirttoukko').json,
+                         [{'id': 1, 'name': "Masi", 'time': "00:15"}])
+
+    def test_concurrent_workers(self):
+        # Two processes writing at the same time don't lose each other's scores
+        workers = [multiprocessing.Process(target=commit_scores, args=(prefix, 25)) for prefix in "AB"]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual([worker.exitcode for worker in workers], [0, 0])
+        self.assertEqual(len(app.load_high_scores()), 50)
+        self.assertEqual(len(player_stats.get_player_stats()), 50)
+
+    def test_export_import_round_trip(self):
+        for name, time in [("Joonas", "00:13"), ("Masi", "00:15"), ("Äijä", "01:02")]:
+            self.post_score(name, time)
+        board = self.client.get('/highscores?password=hirttoukko').json
+
+        # The row counts are logged at a level that is emitted
+        self.assertTrue(app.app.logger.isEnabledFor(logging.INFO))
+        with self.assertLogs(app.app.logger, logging.INFO) as logs:
+            self.client.get('/highscores/export?format=csv&password=hirttoukko').get_data()
+        self.assertEqual(logs.records[-1].getMessage(), "Exported 3 high scores as csv")
+
+        for fmt, content_type in [("csv", "text/csv"), ("ndjson", "application/x-ndjson")]:
+            export = self.client.get(f'/highscores/export?format={fmt}&password=hirttoukko').data
+            # Importing an export of the current high scores doesn't duplicate them
+            response = self.client.post('/highscores/import?password=hirttoukko', data=export,
+                                        content_type=content_type)
+            self.assertEqual(response.json, {'rows': 3, 'rejected': 0, 'imported': 0})
+            self.assertEqual(self.client.get('/highscores?password=hirttoukko').json, board)
+
+        # A restore replaces the high scores with the backup
+        export = self.client.get('/highscores/export?format=csv&password=hirttoukko').data
+        self.post_score("New", "00:01")
+        response = self.client.post('/highscores/import?mode=replace&password=hirttoukko', data=export,
+                                    content_type="text/csv")
+        self.assertEqual(response.json['imported'], 3)
+        self.assertEqual(self.client.get('/highscores?password=hirttoukko').json, board)
+        response = self.client.post('/highscores/import?mode=append&password=hirttoukko', data=export,
+                                    content_type="text/csv")
+        self.assertEqual(response.status_code, 400)
+
+        # Repeated scores of the leaderboard survive an import of an unrelated score
+        self.post_score("Joonas", "00:13")
+        response = self.client.post('/highscores/import?password=hirttoukko',
+                                    data=json.dumps({'name': "X", 'time': "01:00"}) + "\n",
+                                    content_type="application/x-ndjson")
+        self.assertEqual(response.json['imported'], 1)
+        names = [score['name'] for score in self.client.get('/highscores?password=hirttoukko').json]
+        self.assertEqual(names, ["Joonas", "Joonas", "Masi", "X", "Äijä"])
+
 if __name__ == '__main__':
     unittest.main()
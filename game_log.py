@@ -0,0 +1,282 @@
+"""
+Game event log module.
+
+This module records how games are played. Every valid guess in the game is appended to a compact binary log as a
+fixed-width record, and a reader memory-maps the log segments to compute aggregates over millions of games without
+turning the records into Python objects.
+
+The log is a directory of segment files named 'events-00000001.bin', 'events-00000002.bin' and so on. Every
+segment starts with a 16 byte header (the magic b"HANGEVT1" followed by the record size) and is followed by
+16 byte little-endian records:
+
+    offset  size  field
+    0       8     game_id   random 48-bit ID of the game
+    8       4     delta_ms  milliseconds since the previous guess of the game, or since the game started
+    12      2     word_id   line number of the word in 'words.txt', starting from 0
+    14      1     letter    the guessed letter in Latin-1
+    15      1     flags     round number in the low 7 bits, bit 7 set if the letter was in the word
+
+A new segment is started when a game starts and the current one has grown over the maximum segment size, so all
+events of a game are in the same segment. A new segment is also started when the current one does not end on a
+record boundary, e.g. when a game was interrupted in the middle of writing a record. The reader skips such a
+partial record at the end of a segment, and segments that are too short to hold a header.
+"""
+import os
+import random
+import struct
+import time
+
+# Define the path to the game log directory
+game_log_dir = "game_logs"
+
+# Segment header and record layout
+MAGIC = b"HANGEVT1"
+HEADER = struct.Struct("<8sI4x")
+RECORD = struct.Struct("<QIHBB")
+HIT_FLAG = 0x80
+ROUND_MASK = 0x7F
+
+# Start a new segment when the current one is larger than this (about a million guesses)
+MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+
+def segment_paths(log_dir=game_log_dir):
+    """
+    List the segment files of a game log in the order they were written.
+
+    Args:
+        log_dir (str, optional): The game log directory. Defaults to 'game_logs'.
+
+    Returns:
+        list: The paths of the segment files.
+
+    """
+    if not os.path.isdir(log_dir):
+        return []
+    names = sorted(name for name in os.listdir(log_dir) if name.startswith("events-") and name.endswith(".bin"))
+    return [os.path.join(log_dir, name) for name in names]
+
+class GameEventLog:
+    """
+    Append the guesses of one game to the game log.
+
+    Args:
+        log_dir (str, optional): The game log directory. Defaults to 'game_logs'.
+        max_segment_size (int, optional): The size in bytes after which a new segment is started.
+    """
+    def __init__(self, log_dir=game_log_dir, max_segment_size=MAX_SEGMENT_SIZE):
+        self.game_id = random.getrandbits(48)
+        self.last_time = time.monotonic()
+        self.path = None
+        try:
+            self.path = self.open_segment(log_dir, max_segment_size)
+        except OSError:
+            # The game can be played without the log
+            pass
+
+    def open_segment(self, log_dir, max_segment_size):
+        """
+        Pick the segment the game is written to, starting a new one if the latest is full.
+
+        Args:
+            log_dir (str): The game log directory.
+            max_segment_size (int): The size in bytes after which a new segment is started.
+
+        Returns:
+            str: The path of the segment file.
+
+        """
+        os.makedirs(log_dir, exist_ok=True)
+        paths = segment_paths(log_dir)
+        if paths:
+            size = os.path.getsize(paths[-1])
+            # Only append to a segment with a whole header and whole records, so the records stay aligned
+            if HEADER.size <= size < max_segment_size and (size - HEADER.size) % RECORD.size == 0:
+                return paths[-1]
+
+        # Start the next segment with its header
+        number = int(os.path.basename(paths[-1])[len("events-"):-len(".bin")]) + 1 if paths else 1
+        path = os.path.join(log_dir, f"events-{number:08d}.bin")
+        with open(path, 'xb') as f:
+            f.write(HEADER.pack(MAGIC, RECORD.size))
+        return path
+
+    def record(self, word_id, round_number, letter, hit):
+        """
+        Append a guess to the game log.
+
+        Args:
+            word_id (int): The line number of the word in 'words.txt'.
+            round_number (int): The round of the game, starting from 1.
+            letter (str): The guessed letter.
+            hit (bool): True if the letter was in the word.
+
+        """
+        if self.path is None:
+            return
+        if not 0 <= round_number <= ROUND_MASK:
+            # The round does not fit the flags, stop logging the game instead of interrupting it
+            self.path = None
+            return
+        now = time.monotonic()
+        delta_ms = min(int((now - self.last_time) * 1000), 0xFFFFFFFF)
+        self.last_time = now
+        flags = (round_number & ROUND_MASK) | (HIT_FLAG if hit else 0)
+        letter_code = letter.encode('latin-1', 'replace')[0]
+        try:
+            record = RECORD.pack(self.game_id, delta_ms, word_id, letter_code, flags)
+        except struct.error:
+            # The word ID does not fit the record, stop logging the game instead of interrupting it
+            self.path = None
+            return
+        try:
+            with open(self.path, 'ab') as f:
+                f.write(record)
+        except OSError:
+            # Stop logging the game instead of interrupting it
+            self.path = None
+
+def record_dtype():
+    """
+    Build the NumPy dtype of a game log record.
+
+    Returns:
+        numpy.dtype: The structured dtype matching the record layout.
+
+    """
+    import numpy as np
+    return np.dtype([("game_id", "<u8"), ("delta_ms", "<u4"), ("word_id", "<u2"), ("letter", "u1"), ("flags", "u1")])
+
+def read_segments(log_dir=game_log_dir):
+    """
+    Memory-map the segments of a game log one at a time.
+
+    Only whole records are mapped, so a record that was being written when the game was interrupted is skipped.
+    A segment that is too short to hold a header is skipped.
+
+    Args:
+        log_dir (str, optional): The game log directory. Defaults to 'game_logs'.
+
+    Yields:
+        numpy.memmap: The records of a segment, a read-only array with the record dtype.
+
+    Raises:
+        ValueError: If a segment file does not start with a valid header.
+
+    """
+    import numpy as np
+    dtype = record_dtype()
+    for path in segment_paths(log_dir):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        # The header was not completely written
+        if len(header) < HEADER.size:
+            continue
+        magic, record_size = HEADER.unpack(header)
+        if magic != MAGIC or record_size != dtype.itemsize:
+            raise ValueError(f"{path} is not a game log segment")
+        count = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+        if count:
+            yield np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
+
+def hardest_words(words, log_dir=game_log_dir, limit=10):
+    """
+    Find the words with the highest share of missed guesses.
+
+    Args:
+        words (list): The words of 'words.txt', indexed by word ID.
+        log_dir (str, optional): The game log directory. Defaults to 'game_logs'.
+        limit (int, optional): The number of words to return. Defaults to 10.
+
+    Returns:
+        list: A list of (word, guesses, miss_rate) tuples, hardest first.
+
+    """
+    import numpy as np
+    guesses = np.zeros(len(words), dtype=np.int64)
+    misses = np.zeros(len(words), dtype=np.int64)
+    for records in read_segments(log_dir):
+        word_ids = records["word_id"]
+        # Ignore word IDs of an older, longer word list
+        known = word_ids < len(words)
+        word_ids = word_ids[known]
+        missed = (records["flags"][known] & HIT_FLAG) == 0
+        guesses += np.bincount(word_ids, minlength=len(words))
+        misses += np.bincount(word_ids, weights=missed, minlength=len(words)).astype(np.int64)
+
+    played = np.flatnonzero(guesses)
+    miss_rates = misses[played] / guesses[played]
+    order = np.argsort(-miss_rates, kind="stable")[:limit]
+    return [(words[played[i]], int(guesses[played[i]]), float(miss_rates[i])) for i in order]
+
+def letter_hit_rates(log_dir=game_log_dir):
+    """
+    Compute how often each guessed letter was in the word.
+
+    Args:
+        log_dir (str, optional): The game log directory. Defaults to 'game_logs'.
+
+    Returns:
+        dict: A dictionary mapping each guessed letter to a (guesses, hit_rate) tuple.
+
+    """
+    import numpy as np
+    guesses = np.zeros(256, dtype=np.int64)
+    hits = np.zeros(256, dtype=np.int64)
+    for records in read_segments(log_dir):
+        hit = (records["flags"] & HIT_FLAG) != 0
+        guesses += np.bincount(records["letter"], minlength=256)
+        hits += np.bincount(records["letter"], weights=hit, minlength=256).astype(np.int64)
+
+    return {bytes([code]).decode('latin-1'): (int(guesses[code]), float(hits[code] / guesses[code]))
+            for code in np.flatnonzero(guesses)}
+
+def time_per_round(log_dir=game_log_dir):
+    """
+    Compute the mean time spent in each round of the game.
+
+    The time of a round is the sum of the delays of its guesses, so it includes the thinking time before
+    the first guess of the round.
+
+    Args:
+        log_dir (str, optional): The game log directory. Defaults to 'game_logs'.
+
+    Returns:
+        dict: A dictionary mapping each round number to the mean time of the round in seconds.
+
+    """
+    import numpy as np
+    totals = np.zeros(ROUND_MASK + 1)
+    counts = np.zeros(ROUND_MASK + 1, dtype=np.int64)
+    for records in read_segments(log_dir):
+        rounds = records["flags"] & ROUND_MASK
+        # Group the guesses by game and round, a game never spans two segments
+        keys = (records["game_id"] << np.uint64(7)) | rounds.astype(np.uint64)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        round_totals = np.bincount(inverse, weights=records["delta_ms"])
+        round_numbers = (unique_keys & np.uint64(ROUND_MASK)).astype(np.int64)
+        totals += np.bincount(round_numbers, weights=round_totals, minlength=ROUND_MASK + 1)
+        counts += np.bincount(round_numbers, minlength=ROUND_MASK + 1)
+
+    return {int(r): float(totals[r] / counts[r] / 1000) for r in np.flatnonzero(counts)}
+
+def main():
+    """
+    Print an analytics report of the game log.
+
+    """
+    from hangman import words_to_list
+
+    print("Hardest words:")
+    for word, guesses, miss_rate in hardest_words(words_to_list()):
+        print(f" - {word}: {miss_rate:.0%} misses in {guesses} guesses")
+
+    print("Letter hit rates:")
+    for letter, (guesses, hit_rate) in sorted(letter_hit_rates().items()):
+        print(f" - {letter}: {hit_rate:.0%} hits in {guesses} guesses")
+
+    print("Mean time per round:")
+    for round_number, seconds in time_per_round().items():
+        print(f" - Round {round_number}: {seconds:.1f}sec")
+
+if __name__ == '__main__':
+    main()
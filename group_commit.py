@@ -0,0 +1,111 @@
+"""
+Group commit module.
+
+This module batches concurrent writes into a single commit. Request threads submit entries into an in-memory
+buffer and block, while one background writer thread flushes the buffer when it holds enough entries or when
+the oldest entry has waited long enough. Every submitter gets its own result back once the whole batch has
+been committed, so a burst of requests costs one file rewrite and one fsync instead of one per request.
+"""
+import threading
+import time
+
+class PendingEntry:
+    """
+    An entry waiting in the group commit buffer.
+
+    Attributes:
+        entry: The submitted entry.
+        result: The result of the commit for this entry, set by the writer thread.
+        error (Exception): The error raised by the commit, or None if the commit succeeded.
+        done (threading.Event): Set when the batch containing the entry has been committed.
+        enqueued (float): The monotonic time the entry was submitted.
+    """
+    def __init__(self, entry):
+        self.entry = entry
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.enqueued = time.monotonic()
+
+class GroupCommitWriter:
+    """
+    Buffer submitted entries and commit them in batches from a single writer thread.
+
+    Args:
+        commit (callable): A function that takes a list of entries, makes them durable and returns
+            a list with one result per entry, in the same order. A result that is an exception fails
+            only the submitter of that entry, while an exception raised by the function fails the whole batch.
+        max_batch_size (int, optional): Flush as soon as this many entries are buffered. Defaults to 100.
+        max_delay (float, optional): The maximum time in seconds an entry waits in the buffer before
+            its batch is flushed. Defaults to 0.05.
+    """
+    def __init__(self, commit, max_batch_size=100, max_delay=0.05):
+        self.commit = commit
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.condition = threading.Condition()
+        self.pending = []
+        self.thread = None
+
+    def submit(self, entry):
+        """
+        Add an entry to the buffer and wait until its batch has been committed.
+
+        Args:
+            entry: The entry to commit.
+
+        Returns:
+            The result the commit function returned for the entry.
+
+        Raises:
+            Exception: The error of the entry, or the error raised by the commit function if the batch failed.
+        """
+        pending = PendingEntry(entry)
+        with self.condition:
+            # Start the writer thread on first use, so it is created after a Gunicorn worker has forked
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="group-commit-writer", daemon=True)
+                self.thread.start()
+            self.pending.append(pending)
+            # Wake up the writer if it is idle or if the batch is full
+            if len(self.pending) == 1 or len(self.pending) >= self.max_batch_size:
+                self.condition.notify()
+
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def run(self):
+        """
+        Flush the buffer whenever the batch is full or its oldest entry has waited max_delay seconds.
+        """
+        while True:
+            with self.condition:
+                # Wait until there is something to flush
+                while not self.pending:
+                    self.condition.wait()
+                # Wait for more entries until the batch is full or the deadline of the oldest entry is reached
+                deadline = self.pending[0].enqueued + self.max_delay
+                while len(self.pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.pending[:self.max_batch_size]
+                del self.pending[:self.max_batch_size]
+
+            # Commit the batch outside the lock, so new entries can be buffered meanwhile
+            try:
+                results = self.commit([pending.entry for pending in batch])
+                for pending, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        pending.error = result
+                    else:
+                        pending.result = result
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
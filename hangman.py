@@ -6,13 +6,13 @@ including starting a new game, getting user input, checking user guesses, and di
 game information.
 
 """
-import random
 import time
-import requests
 import re
 from datetime import timedelta
 import os
 import json
+from game_log import GameEventLog
+import word_index
 
 def main():
     """
@@ -35,7 +35,7 @@ def main():
         else:
             print("Invalid input. Please enter a valid choice.")
 
-def hangman():
+def hangman(word_selection="balanced"):
     """
     Executes the Hangman game.
 
@@ -43,9 +43,17 @@ def hangman():
     the word. If the letter is not in the word, a part of the hangman is drawn on the screen. The game ends when the player
     has guessed three words, or the hangman has been fully drawn.
 
+    Args:
+        word_selection (str, optional): How the three words are picked by difficulty: 'random', 'balanced' (one easy,
+        one medium and one hard word in random order) or 'progressive' (from the easiest to the hardest). Defaults to 'balanced'.
+
     """
-    # Select three random words from the list
-    words = random.sample(words_to_list(), 3)
+    # Select three words from the list by difficulty, the line numbers identify the words in the game log
+    word_list = words_to_list()
+    word_ids = word_index.select_words(word_index.load_word_index(), word_selection)
+    words = [word_list[word_id] for word_id in word_ids]
+    # Record every guess of the game in the game log
+    event_log = GameEventLog()
 
     # Initialize game state variables
     guessed_letters = set()
@@ -68,6 +76,7 @@ def hangman():
             guess = input("Guess a letter: ").upper()  # get user input for a guess and convert to uppercase
             if not is_valid_guess(guess, guessed_letters):  # if the guess is invalid, skip to the next iteration of the loop
                 continue
+            event_log.record(word_ids[rounds - 1], rounds, guess, guess in secret_word)  # append the guess to the game log
             if guess not in secret_word:
                 incorrect_guesses += 1
                 guesses_remaining = max_guesses - incorrect_guesses  # update the number of remaining guesses
@@ -351,6 +360,8 @@ def send_highscore(name, time):
     with open('high_scores.json', 'w') as f:
         json.dump(high_scores, f, indent=4)
 
+    # Import requests on first use, it is slow to import and not needed for playing offline
+    import requests
     # Send a POST request to the server with the high score data
     response = requests.post(url, json=data)
     # Check the response status code to see if the high score was successfully sent
@@ -364,6 +375,8 @@ def high_scores():
     This function retrieves the high scores from an API endpoint and provides the user with a menu to display the scores.
     
     """
+    # Import requests on first use, it is slow to import and not needed for playing offline
+    import requests
     while True:
         # Send a GET request to the high scores API endpoint
         response = requests.get('https://python-project-hangman-46b9.onrender.com/highscores?password=hirttoukko')
@@ -0,0 +1,259 @@
+"""
+Leaderboard snapshot module.
+
+This module publishes the sorted leaderboard as an immutable binary snapshot file that the read routes of the
+backend serve from. Every Gunicorn worker memory-maps the same file, so the leaderboard is held once in the page
+cache no matter how many workers there are, and reading it needs no JSON parsing.
+
+A snapshot file has a 56 byte header, fixed-width records sorted by time and a string table:
+
+    header   magic b"HANGSNP2", version, and the modification time, size and inode of the high scores file the
+             snapshot was built from (8 bytes each), record count, record size and string table offset (4 bytes each)
+    record   id, time in seconds, name offset, name length, time length and time offset (20 bytes)
+    strings  the UTF-8 encoded names and "MM:SS" times
+
+All numbers are little-endian and string offsets are relative to the start of the string table.
+
+A snapshot is built before the high scores file is saved, so a leaderboard that can't be published is never
+saved. The version is the time the high scores file was saved. A snapshot is written to a temporary file and
+renamed over the old one unless the old one has a newer version, so a snapshot is never modified in place.
+publish_snapshot() does not lock, so the version check only keeps a late writer from publishing an older
+leaderboard over a newer one when the writers hold a common lock, as the backend's writers do. Readers check the file before each read
+and map the new version when it has been replaced by a newer one, while requests that are still using the old
+mapping keep it until they finish. The read routes compare the source of the snapshot with the high scores file
+and publish it again when the file has been changed without publishing, e.g. by hand.
+"""
+import mmap
+import os
+import struct
+from player_stats import time_to_seconds
+
+# Define the path to the leaderboard snapshot file
+snapshot_file = "high_scores.snapshot"
+
+# Snapshot header and record layout, the stamp is the version and the source of the snapshot
+MAGIC = b"HANGSNP2"
+HEADER = struct.Struct("<8sQQQQIII4x")
+STAMP = struct.Struct("<QQQQ")
+RECORD = struct.Struct("<IIIHHI")
+
+def stat_stamp(stat):
+    """
+    Identify the contents of a high scores file by its modification time, size and inode.
+
+    A rename keeps all three, so the stamp of a temporary file matches the file it is renamed to.
+
+    Args:
+        stat (os.stat_result): The status of the file.
+
+    Returns:
+        tuple: The (mtime_ns, size, inode) of the file.
+
+    """
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def source_stamp(path):
+    """
+    Get the stamp of a high scores file, see stat_stamp().
+
+    Args:
+        path (str): The path of the high scores file.
+
+    Returns:
+        tuple: The (mtime_ns, size, inode) of the file, or None if the file does not exist.
+
+    """
+    try:
+        return stat_stamp(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+def build_snapshot(high_scores):
+    """
+    Build a leaderboard snapshot, without its version and source.
+
+    Args:
+        high_scores (list): A list of high score dictionaries.
+
+    Returns:
+        bytearray: The snapshot, to be published with publish_snapshot().
+
+    Raises:
+        ValueError: If a high score can't be stored in a snapshot.
+
+    """
+    records = bytearray()
+    strings = bytearray()
+    for score in sorted(high_scores, key=lambda score: score['time']):
+        try:
+            name = score['name'].encode('utf-8')
+            time_str = score['time'].encode('utf-8')
+            try:
+                seconds = time_to_seconds(score['time'])
+            except ValueError:
+                # Only the time string is served, the seconds are informational
+                seconds = 0
+            records += RECORD.pack(score['id'], seconds, len(strings), len(name),
+                                   len(time_str), len(strings) + len(name))
+        except (KeyError, AttributeError, TypeError, struct.error) as e:
+            raise ValueError(f"Invalid high score {score!r}: {e}") from e
+        strings += name + time_str
+
+    header = HEADER.pack(MAGIC, 0, 0, 0, 0, len(high_scores), RECORD.size, HEADER.size + len(records))
+    return bytearray(header + records + strings)
+
+def publish_snapshot(snapshot, version, source, path=snapshot_file):
+    """
+    Stamp a built snapshot and atomically replace the old one, unless the old one is newer.
+
+    The check and the replace are not atomic, concurrent writers must hold a common lock.
+
+    Args:
+        snapshot (bytearray): The snapshot from build_snapshot().
+        version (int): The version of the snapshot, the time in nanoseconds the high scores were saved.
+        source (tuple): The stamp of the high scores file the snapshot was built from, see source_stamp().
+        path (str, optional): The path of the snapshot file. Defaults to 'high_scores.snapshot'.
+
+    Returns:
+        bool: True if the snapshot was published, False if a newer one has been published already.
+
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) == HEADER.size and header[:len(MAGIC)] == MAGIC and HEADER.unpack(header)[1] > version:
+            return False
+    except FileNotFoundError:
+        pass
+
+    STAMP.pack_into(snapshot, len(MAGIC), version, *(source or (0, 0, 0)))
+    # Every process writes its own temporary file, so Gunicorn workers don't overwrite each other's
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(snapshot)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+    return True
+
+class LeaderboardSnapshot:
+    """
+    A memory-mapped, read-only leaderboard snapshot.
+
+    Args:
+        path (str): The path of the snapshot file.
+
+    Raises:
+        ValueError: If the file is not a leaderboard snapshot.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.file_id = (stat.st_dev, stat.st_ino)
+            # The mapping stays valid after the file is closed and replaced
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        if len(self.view) < HEADER.size:
+            raise ValueError(f"{path} is not a leaderboard snapshot")
+        magic, self.version, mtime_ns, size, inode, self.count, record_size, self.strings_offset = \
+            HEADER.unpack_from(self.view)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a leaderboard snapshot")
+        # The stamp of the high scores file the snapshot was built from
+        self.source = (mtime_ns, size, inode)
+        self.records = self.view[HEADER.size:HEADER.size + self.count * RECORD.size]
+
+    def score(self, record):
+        """
+        Decode a record into a high score dictionary.
+
+        Args:
+            record (tuple): The unpacked record.
+
+        Returns:
+            dict: The high score with 'id', 'name' and 'time' fields.
+
+        """
+        score_id, seconds, name_offset, name_length, time_length, time_offset = record
+        name_start = self.strings_offset + name_offset
+        time_start = self.strings_offset + time_offset
+        return {'id': score_id,
+                'name': str(self.view[name_start:name_start + name_length], 'utf-8'),
+                'time': str(self.view[time_start:time_start + time_length], 'utf-8')}
+
+    def scores(self, reverse=False, limit=None):
+        """
+        Get the high scores of the snapshot.
+
+        Args:
+            reverse (bool, optional): If True, the slowest scores come first. Defaults to False.
+            limit (int, optional): The maximum number of scores to return. Defaults to None (all scores).
+
+        Returns:
+            list: A list of high score dictionaries sorted by time.
+
+        """
+        if reverse:
+            high_scores = [self.score(record) for record in RECORD.iter_unpack(self.records)]
+            high_scores.sort(key=lambda score: score['time'], reverse=True)
+            return high_scores[:limit]
+        count = self.count if limit is None else min(limit, self.count)
+        return [self.score(record) for record in RECORD.iter_unpack(self.records[:count * RECORD.size])]
+
+    def find(self, score_id):
+        """
+        Find a high score by ID.
+
+        Args:
+            score_id (int): The ID of the high score.
+
+        Returns:
+            dict: The high score dictionary, or None if there is no score with the ID.
+
+        """
+        for offset in range(0, len(self.records), RECORD.size):
+            # The ID is the first field of a record
+            if struct.unpack_from("<I", self.records, offset)[0] == score_id:
+                return self.score(RECORD.unpack_from(self.records, offset))
+        return None
+
+class SnapshotReader:
+    """
+    Serve reads from the latest snapshot, mapping a new version when the file has been replaced by a newer one.
+
+    Args:
+        path (str, optional): The path of the snapshot file. Defaults to 'high_scores.snapshot'.
+    """
+    def __init__(self, path=snapshot_file):
+        self.path = path
+        self.snapshot = None
+        # The file ID of a replacing snapshot that was older than the mapped one
+        self.rejected = None
+
+    def current(self):
+        """
+        Get the latest snapshot.
+
+        Returns:
+            LeaderboardSnapshot: The latest snapshot, or None if no snapshot has been published or the file
+            is not a snapshot of this format.
+
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        snapshot = self.snapshot
+        file_id = (stat.st_dev, stat.st_ino)
+        if snapshot is None or (snapshot.file_id != file_id and file_id != self.rejected):
+            try:
+                new_snapshot = LeaderboardSnapshot(self.path)
+            except ValueError:
+                return None
+            if snapshot is None or new_snapshot.version >= snapshot.version:
+                # Swap in the new version, requests using the old one keep their reference to it
+                snapshot = new_snapshot
+                self.snapshot = snapshot
+            else:
+                self.rejected = file_id
+        return snapshot
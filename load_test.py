@@ -0,0 +1,326 @@
+"""
+Load test module.
+
+This module replays the requests of 'test.http' (or of a JSON lines scenario file) against a running backend,
+e.g. 'python app.py' or 'gunicorn -w 4 app:app', and reports latency percentiles, throughput and error rate.
+
+Requests are sent with asyncio over plain HTTP/1.1 connections. The scheme and host of the scenario URLs are
+replaced with the target given on the command line, so the cloud URLs of 'test.http' can be replayed locally.
+
+A scenario file has one JSON object per line:
+
+{"name": "top 3", "method": "GET", "path": "/?sort=asc&limit=3&password=hirttoukko", "weight": 5}
+{"name": "add", "method": "POST", "path": "/highscores?password=hirttoukko", "body": {"name": "Joonas", "time": "00:40"}}
+
+Run it with:
+
+    python load_test.py --target http://127.0.0.1:5000 --requests 2000 --concurrency 20 --rate 200
+
+Every run can be labelled and appended to a results file, so runs against different storage backends or worker
+counts can be compared.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+class Scenario:
+    """
+    A request to replay.
+
+    Attributes:
+        name (str): The name shown in the report.
+        method (str): The HTTP method.
+        path (str): The path and query string of the request.
+        headers (dict): The request headers.
+        body (bytes): The request body.
+        weight (float): The relative share of the scenario in the request mix.
+    """
+    def __init__(self, name, method, path, headers=None, body=b"", weight=1.0):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.headers = headers or {}
+        self.body = body
+        self.weight = weight
+
+def path_of(url):
+    """
+    Get the path and query string of a URL.
+
+    Args:
+        url (str): An absolute URL or a path.
+
+    Returns:
+        str: The path and query string, starting with '/'.
+
+    """
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return path
+
+def parse_http_file(text):
+    """
+    Parse the requests of a '.http' file.
+
+    Requests are separated by lines starting with '###'. Each request has a "METHOD URL" line,
+    optional header lines and an optional body after an empty line.
+
+    Args:
+        text (str): The contents of the '.http' file.
+
+    Returns:
+        list: A list of Scenario objects.
+
+    """
+    scenarios = []
+    for block in text.split("\n###"):
+        lines = [line.rstrip("\r") for line in block.strip("#\n").splitlines()]
+        # Skip empty blocks and comments before the request line
+        while lines and (not lines[0].strip() or lines[0].lstrip().startswith("#")):
+            lines.pop(0)
+        if not lines:
+            continue
+        method, url = lines[0].split()[:2]
+        headers = {}
+        index = 1
+        while index < len(lines) and lines[index].strip():
+            key, value = lines[index].split(":", 1)
+            headers[key.strip()] = value.strip()
+            index += 1
+        body = "\n".join(lines[index:]).strip().encode('utf-8')
+        scenarios.append(Scenario(f"{method} {path_of(url)}", method, path_of(url), headers, body))
+    return scenarios
+
+def parse_scenario_file(text):
+    """
+    Parse the requests of a JSON lines scenario file.
+
+    Args:
+        text (str): The contents of the scenario file.
+
+    Returns:
+        list: A list of Scenario objects.
+
+    """
+    scenarios = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        method = data.get("method", "GET").upper()
+        path = path_of(data["path"])
+        headers = dict(data.get("headers", {}))
+        body = data.get("body", b"")
+        if not isinstance(body, str) and body != b"":
+            body = json.dumps(body)
+            headers.setdefault("Content-Type", "application/json")
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        scenarios.append(Scenario(data.get("name", f"{method} {path}"), method, path, headers, body,
+                                  float(data.get("weight", 1.0))))
+    return scenarios
+
+def load_scenarios(path):
+    """
+    Load scenarios from a '.http' file or from a JSON lines scenario file.
+
+    Args:
+        path (str): The path of the file. Files ending with '.jsonl' are read as scenario files.
+
+    Returns:
+        list: A list of Scenario objects.
+
+    """
+    with open(path, 'r') as f:
+        text = f.read()
+    if path.endswith(".jsonl"):
+        return parse_scenario_file(text)
+    return parse_http_file(text)
+
+async def send_request(host, port, scenario, timeout):
+    """
+    Send a request over a new HTTP/1.1 connection and read the whole response.
+
+    Args:
+        host (str): The host of the target.
+        port (int): The port of the target.
+        scenario (Scenario): The request to send.
+        timeout (float): The maximum time in seconds to wait for the response.
+
+    Returns:
+        int: The HTTP status code of the response.
+
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        headers = {"Host": f"{host}:{port}", "Connection": "close", "Content-Length": str(len(scenario.body))}
+        headers.update(scenario.headers)
+        head = f"{scenario.method} {scenario.path} HTTP/1.1\r\n"
+        head += "".join(f"{key}: {value}\r\n" for key, value in headers.items()) + "\r\n"
+        writer.write(head.encode('latin-1') + scenario.body)
+        await writer.drain()
+        # The server closes the connection after the response
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    status_line = response.split(b"\r\n", 1)[0].split()
+    return int(status_line[1])
+
+def percentile(sorted_values, p):
+    """
+    Get a percentile of sorted values with the nearest-rank method.
+
+    Args:
+        sorted_values (list): The values in ascending order.
+        p (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile, or None if there are no values.
+
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+async def run_load(target, scenarios, total_requests, concurrency, rate=None, timeout=10.0, seed=None):
+    """
+    Fire a weighted mix of scenarios at the target.
+
+    Without a rate, 'concurrency' requests are kept in flight all the time. With a rate, requests are started
+    on a fixed schedule of 'rate' requests per second, at most 'concurrency' at a time, and latency is measured
+    from the scheduled start, so a server that falls behind shows up in the latencies.
+
+    Args:
+        target (str): The base URL of the backend, e.g. 'http://127.0.0.1:5000'.
+        scenarios (list): The Scenario objects to replay.
+        total_requests (int): The number of requests to send.
+        concurrency (int): The maximum number of requests in flight.
+        rate (float, optional): The request rate in requests per second. Defaults to None (as fast as possible).
+        timeout (float, optional): The timeout of a request in seconds. Defaults to 10.
+        seed (int, optional): The seed of the random scenario mix. Defaults to None.
+
+    Returns:
+        dict: The results with latencies, status counts and the duration of the run.
+
+    """
+    parts = urlsplit(target)
+    host = parts.hostname or "127.0.0.1"
+    port = parts.port or 80
+    rng = random.Random(seed)
+    plan = rng.choices(scenarios, weights=[scenario.weight for scenario in scenarios], k=total_requests)
+
+    latencies = []
+    statuses = {}
+    errors = 0
+    per_scenario = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    async def fire(index, scenario):
+        nonlocal errors
+        scheduled = start + index / rate if rate else None
+        if scheduled is not None:
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        async with semaphore:
+            sent = scheduled if scheduled is not None else time.perf_counter()
+            try:
+                status = await send_request(host, port, scenario, timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = "error"
+            latency = time.perf_counter() - sent
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == "error" or status >= 400:
+            errors += 1
+        latencies.append(latency)
+        per_scenario.setdefault(scenario.name, []).append(latency)
+
+    if rate:
+        await asyncio.gather(*(fire(i, scenario) for i, scenario in enumerate(plan)))
+    else:
+        # Keep a fixed number of workers busy until the plan is exhausted
+        queue = iter(enumerate(plan))
+        async def worker():
+            for i, scenario in queue:
+                await fire(i, scenario)
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return {"latencies": latencies, "statuses": statuses, "errors": errors,
+            "per_scenario": per_scenario, "duration": time.perf_counter() - start}
+
+def summarize(results):
+    """
+    Summarize the results of a load test run.
+
+    Args:
+        results (dict): The results returned by run_load().
+
+    Returns:
+        dict: The request count, throughput, error rate, latency percentiles in milliseconds,
+        status code counts and p95 latency per scenario.
+
+    """
+    latencies = sorted(results["latencies"])
+    count = len(latencies)
+    summary = {
+        "requests": count,
+        "duration": round(results["duration"], 3),
+        "throughput": round(count / results["duration"], 1) if results["duration"] else None,
+        "error_rate": round(results["errors"] / count, 4) if count else None,
+        "statuses": {str(status): n for status, n in sorted(results["statuses"].items(), key=str)},
+        "scenario_p95_ms": {name: round(percentile(sorted(values), 95) * 1000, 2)
+                            for name, values in results["per_scenario"].items()},
+    }
+    for p in (50, 95, 99):
+        value = percentile(latencies, p)
+        summary[f"p{p}_ms"] = round(value * 1000, 2) if value is not None else None
+    return summary
+
+def main():
+    """
+    Parse the command line arguments, run the load test and print the report.
+
+    """
+    parser = argparse.ArgumentParser(description="Replay test.http scenarios against a local backend.")
+    parser.add_argument("--target", default="http://127.0.0.1:5000", help="base URL of the backend")
+    parser.add_argument("--scenarios", default="test.http", help=".http file or .jsonl scenario file")
+    parser.add_argument("--weights", help="comma separated weights, one per scenario in file order")
+    parser.add_argument("--requests", type=int, default=1000, help="number of requests to send")
+    parser.add_argument("--concurrency", type=int, default=10, help="maximum number of requests in flight")
+    parser.add_argument("--rate", type=float, help="requests per second, default is as fast as possible")
+    parser.add_argument("--timeout", type=float, default=10.0, help="timeout of a request in seconds")
+    parser.add_argument("--seed", type=int, help="seed of the random request mix")
+    parser.add_argument("--label", default="", help="label of the run, e.g. the backend and worker count")
+    parser.add_argument("--output", help="append the summary of the run as a JSON line to this file")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios)
+    if args.weights:
+        weights = [float(weight) for weight in args.weights.split(",")]
+        if len(weights) != len(scenarios):
+            parser.error(f"--weights needs {len(scenarios)} values, one per scenario")
+        for scenario, weight in zip(scenarios, weights):
+            scenario.weight = weight
+
+    results = asyncio.run(run_load(args.target, scenarios, args.requests, args.concurrency,
+                                   args.rate, args.timeout, args.seed))
+    summary = summarize(results)
+    summary = {"label": args.label, "target": args.target, "concurrency": args.concurrency, "rate": args.rate, **summary}
+
+    print(f"Requests: {summary['requests']} in {summary['duration']}s ({summary['throughput']} req/s)")
+    print(f"Error rate: {summary['error_rate']:.2%}  Statuses: {summary['statuses']}")
+    print(f"Latency: p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms")
+    for name, p95 in summary["scenario_p95_ms"].items():
+        print(f" - {name}: p95 {p95} ms")
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(summary) + "\n")
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,35 @@
-import bcrypt
+"""
+Password store module.
+
+This module holds the password of the high score API. The bcrypt hash of the password is expensive to compute,
+so it is only computed the first time 'password_store.password_hash' is accessed and cached after that.
+"""
 
 # Define the plain text password
 password = "hirttoukko"
 
-# Hash the password using bcrypt
-hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+# The hashed password, computed on first use
+_password_hash = None
+
+def __getattr__(name):
+    """
+    Compute the hashed password lazily when 'password_hash' is accessed.
+
+    Args:
+        name (str): The name of the module attribute.
+
+    Returns:
+        bytes: The bcrypt hash of the password.
 
-# Store the hashed password
-password_hash = hashed_password
+    Raises:
+        AttributeError: If the module has no attribute with the given name.
 
-print(password_hash)
\ No newline at end of file
+    """
+    global _password_hash
+    if name != "password_hash":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _password_hash is None:
+        import bcrypt
+        # Hash the password using bcrypt
+        _password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return _password_hash
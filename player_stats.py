@@ -0,0 +1,317 @@
+"""
+Player statistics module.
+
+This module keeps running aggregate statistics for every player that has submitted a high score. The statistics
+are updated incrementally on every submission, so they survive even when the score itself drops out of the
+top 50 list, and they never have to be recomputed from raw history.
+
+The statistics of each player are stored in their own JSON file in the 'player_stats' directory, named by the
+SHA-256 hash of the player name, with the following format:
+
+{
+    "name": "Player1",
+    "count": 3,
+    "best": 13,
+    "total": 60,
+    "median": {"count": 3, "heights": [13, 20, 27], "positions": [], "desired": []},
+    "recent": [13, 20, 27],
+    "recent_total": 60
+}
+
+Times are stored in seconds. The median is estimated with the P-square streaming quantile algorithm, which only
+keeps five markers per player, so updating the aggregates of a player is O(1) no matter how many games the player
+has played. A new score only loads and rewrites the file of its player, so a submission is O(1) of I/O no matter
+how many players there are. Only listing the statistics of all players reads every file.
+"""
+import hashlib
+import json
+import os
+import re
+
+# Define the path to the player statistics directory
+player_stats_dir = "player_stats"
+
+# A valid score has a name of 1-20 characters and a "MM:SS" time
+MAX_NAME_LENGTH = 20
+TIME_PATTERN = re.compile(r'^\d{2}:[0-5]\d$')
+
+# Number of latest submissions used for the recent trend
+RECENT_WINDOW = 10
+
+# Desired marker position increments of the P-square algorithm for the median (p = 0.5)
+MEDIAN_INCREMENTS = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+def is_valid_score(name, time_str):
+    """
+    Check that a name and a time make a valid high score.
+
+    Args:
+        name: The name of the player, a string of 1-20 characters.
+        time_str: The time, a string in "MM:SS" format.
+
+    Returns:
+        bool: True if the score is valid, otherwise False.
+
+    """
+    if not isinstance(name, str) or not 0 < len(name) <= MAX_NAME_LENGTH:
+        return False
+    return isinstance(time_str, str) and TIME_PATTERN.match(time_str) is not None
+
+def time_to_seconds(time_str):
+    """
+    Convert a "MM:SS" time string to seconds.
+
+    Args:
+        time_str (str): The time in "MM:SS" format.
+
+    Returns:
+        int: The time in seconds.
+
+    Raises:
+        ValueError: If the time is not in "MM:SS" format.
+
+    """
+    if not isinstance(time_str, str) or not TIME_PATTERN.match(time_str):
+        raise ValueError(f"Invalid time: {time_str!r}")
+    minutes, seconds = time_str.split(':')
+    return int(minutes) * 60 + int(seconds)
+
+def seconds_to_time(seconds):
+    """
+    Convert seconds to a "MM:SS" time string.
+
+    Args:
+        seconds (float): The time in seconds.
+
+    Returns:
+        str: The time in "MM:SS" format.
+
+    """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes:02d}:{seconds:02d}"
+
+def new_median_sketch():
+    """
+    Create an empty P-square median sketch.
+
+    Returns:
+        dict: The sketch state. Until five observations have been seen, 'heights' holds the sorted observations.
+
+    """
+    return {"count": 0, "heights": [], "positions": [], "desired": []}
+
+def update_median_sketch(sketch, x):
+    """
+    Add an observation to a P-square median sketch in constant time.
+
+    Args:
+        sketch (dict): The sketch state created by new_median_sketch().
+        x (float): The observation to add.
+
+    """
+    sketch["count"] += 1
+    heights = sketch["heights"]
+
+    # Collect the first five observations as they are, they become the initial markers
+    if sketch["count"] <= 5:
+        heights.append(x)
+        heights.sort()
+        if sketch["count"] == 5:
+            sketch["positions"] = [0, 1, 2, 3, 4]
+            sketch["desired"] = [0.0, 1.0, 2.0, 3.0, 4.0]
+        return
+
+    positions = sketch["positions"]
+    desired = sketch["desired"]
+
+    # Find the cell k the observation falls into, extending the extreme markers if needed
+    if x < heights[0]:
+        heights[0] = x
+        k = 0
+    elif x >= heights[4]:
+        heights[4] = x
+        k = 3
+    else:
+        k = 0
+        while x >= heights[k + 1]:
+            k += 1
+
+    # Shift the positions of the markers above the cell and advance the desired positions
+    for i in range(k + 1, 5):
+        positions[i] += 1
+    for i in range(5):
+        desired[i] += MEDIAN_INCREMENTS[i]
+
+    # Adjust the heights of the three middle markers if they drifted from their desired positions
+    for i in range(1, 4):
+        d = desired[i] - positions[i]
+        if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+            d = 1 if d > 0 else -1
+            # Try the piecewise-parabolic prediction first
+            height = heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+                (positions[i] - positions[i - 1] + d) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+                + (positions[i + 1] - positions[i] - d) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+            # Fall back to linear prediction if the parabola would break the marker ordering
+            if not heights[i - 1] < height < heights[i + 1]:
+                height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+            heights[i] = height
+            positions[i] += d
+
+def median_estimate(sketch):
+    """
+    Get the median estimate of a P-square median sketch.
+
+    Args:
+        sketch (dict): The sketch state created by new_median_sketch().
+
+    Returns:
+        float: The estimated median, or None if the sketch is empty.
+
+    """
+    heights = sketch["heights"]
+    if not heights:
+        return None
+    # With five or more observations the middle marker is the estimate
+    if sketch["count"] >= 5:
+        return heights[2]
+    # Otherwise the exact median of the stored observations is used
+    middle = len(heights) // 2
+    if len(heights) % 2:
+        return heights[middle]
+    return (heights[middle - 1] + heights[middle]) / 2
+
+def player_stats_path(name):
+    """
+    Get the path of the statistics file of a player.
+
+    Args:
+        name (str): The name of the player.
+
+    Returns:
+        str: The path of the file, named by the SHA-256 hash of the name so any name makes a valid file name.
+
+    """
+    return os.path.join(player_stats_dir, hashlib.sha256(name.encode('utf-8')).hexdigest() + ".json")
+
+def load_player_stats(names=None):
+    """
+    Load the player statistics from the 'player_stats' directory.
+
+    Args:
+        names (iterable, optional): The names of the players to load. If None, all players are loaded.
+
+    Returns:
+        dict: A dictionary of player aggregates keyed by player name. Players without statistics are left out.
+
+    """
+    if names is None:
+        if not os.path.isdir(player_stats_dir):
+            return {}
+        paths = [os.path.join(player_stats_dir, file_name) for file_name in os.listdir(player_stats_dir)
+                 if file_name.endswith(".json")]
+    else:
+        paths = [player_stats_path(name) for name in names]
+
+    stats = {}
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                player = json.load(f)
+        except FileNotFoundError:
+            continue
+        stats[player.pop("name")] = player
+    return stats
+
+def save_player_stats(stats):
+    """
+    Save the statistics of players to their files in the 'player_stats' directory.
+
+    Each file is written to a temporary file which is renamed over the player's file, so readers never see
+    a partially written file. The files of players that are not in the dictionary are not touched.
+
+    Args:
+        stats (dict): A dictionary of player aggregates keyed by player name.
+
+    """
+    os.makedirs(player_stats_dir, exist_ok=True)
+    for name, player in stats.items():
+        path = player_stats_path(name)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(dict(player, name=name), f)
+        os.replace(temp_file, path)
+
+def update_player_stats(stats, name, time_str):
+    """
+    Update the running aggregates of a player with a new score.
+
+    Args:
+        stats (dict): A dictionary of player aggregates keyed by player name.
+        name (str): The name of the player.
+        time_str (str): The time of the new score in "MM:SS" format.
+
+    """
+    seconds = time_to_seconds(time_str)
+    player = stats.get(name)
+    if player is None:
+        player = {"count": 0, "best": seconds, "total": 0, "median": new_median_sketch(), "recent": [], "recent_total": 0}
+        stats[name] = player
+
+    # Update the count, best and total time
+    player["count"] += 1
+    player["best"] = min(player["best"], seconds)
+    player["total"] += seconds
+    update_median_sketch(player["median"], seconds)
+
+    # Keep a fixed size window of the latest times with a running sum
+    player["recent"].append(seconds)
+    player["recent_total"] += seconds
+    if len(player["recent"]) > RECENT_WINDOW:
+        player["recent_total"] -= player["recent"].pop(0)
+
+def summarize_player(name, player):
+    """
+    Build the public summary of a player's aggregates.
+
+    The trend is the difference between the mean of the latest scores and the overall mean, so a negative
+    trend means the player has been getting faster.
+
+    Args:
+        name (str): The name of the player.
+        player (dict): The aggregates of the player.
+
+    Returns:
+        dict: The summary with times in "MM:SS" format and the trend in seconds.
+
+    """
+    mean = player["total"] / player["count"]
+    recent_mean = player["recent_total"] / len(player["recent"])
+    return {
+        "name": name,
+        "count": player["count"],
+        "best": seconds_to_time(player["best"]),
+        "mean": seconds_to_time(mean),
+        "median": seconds_to_time(median_estimate(player["median"])),
+        "recent_mean": seconds_to_time(recent_mean),
+        "trend": round(recent_mean - mean, 1),
+    }
+
+def get_player_stats(name=None):
+    """
+    Get the statistics summaries of all players or of a single player.
+
+    Args:
+        name (str, optional): The name of the player. If None, summaries of all players are returned.
+
+    Returns:
+        list | dict: A list of summaries sorted by best time, the summary of the given player,
+        or None if the player has no statistics.
+
+    """
+    if name is not None:
+        player = load_player_stats([name]).get(name)
+        return summarize_player(name, player) if player else None
+    stats = load_player_stats()
+    summaries = [summarize_player(player_name, player) for player_name, player in stats.items()]
+    summaries.sort(key=lambda summary: summary['best'])
+    return summaries
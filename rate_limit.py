@@ -0,0 +1,113 @@
+"""
+Rate limit module.
+
+This module provides token bucket rate limiting for the high score API. A RateLimiter keeps one bucket per client
+and one global bucket shared by all clients. A request is admitted only if both buckets have a token, otherwise
+the caller gets the number of seconds until it can retry.
+
+Client buckets are kept in an in-process dictionary ordered by last use. A bucket that has been idle long enough
+to refill completely is equal to a new bucket, so such buckets are evicted from the front of the dictionary as
+requests come in, which keeps the memory use bounded by the number of recently active clients.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously.
+
+    Args:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens, i.e. the allowed burst.
+        now (float): The current monotonic time.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def wait_time(self, now):
+        """
+        Refill the bucket and get the time until it has a token.
+
+        Args:
+            now (float): The current monotonic time.
+
+        Returns:
+            float: 0 if a token is available, otherwise the number of seconds until one is.
+
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class RateLimiter:
+    """
+    Admit requests with a token bucket per client and a global token bucket.
+
+    Args:
+        client_rate (float): The tokens per second of each client.
+        client_burst (float): The bucket capacity of each client.
+        global_rate (float): The tokens per second shared by all clients.
+        global_burst (float): The capacity of the global bucket.
+        max_clients (int, optional): The maximum number of client buckets kept. When the limit is reached
+            the least recently used bucket is dropped. Defaults to 10000.
+    """
+    def __init__(self, client_rate, client_burst, global_rate, global_burst, max_clients=10000):
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        # A bucket idle for this long is full again and can be dropped
+        self.idle_timeout = client_burst / client_rate
+        self.global_bucket = TokenBucket(global_rate, global_burst, time.monotonic())
+        self.clients = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, client):
+        """
+        Try to take a token for a request of a client.
+
+        Args:
+            client (str): The key of the client, e.g. its IP address.
+
+        Returns:
+            float: 0 if the request is admitted, otherwise the number of seconds the client should wait.
+
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.clients.get(client)
+            if bucket is None:
+                bucket = TokenBucket(self.client_rate, self.client_burst, now)
+                self.clients[client] = bucket
+                self.evict(now)
+            else:
+                self.clients.move_to_end(client)
+
+            # Take a token from both buckets only if both have one
+            wait = max(bucket.wait_time(now), self.global_bucket.wait_time(now))
+            if wait == 0:
+                bucket.tokens -= 1
+                self.global_bucket.tokens -= 1
+            return wait
+
+    def evict(self, now):
+        """
+        Drop the client buckets that have been idle long enough to refill, and the least recently used
+        buckets over the maximum number of clients.
+
+        Args:
+            now (float): The current monotonic time.
+
+        """
+        while self.clients:
+            client, bucket = next(iter(self.clients.items()))
+            if now - bucket.updated < self.idle_timeout and len(self.clients) <= self.max_clients:
+                break
+            del self.clients[client]
@@ -0,0 +1,266 @@
+"""
+Score transfer module.
+
+This module streams high scores in and out of the high scores file for backups and migrations. Scores are
+exported as CSV or NDJSON (one JSON object per line) and imported from the same formats. Everything works on
+iterators, one row at a time, so the size of an export or an import is not limited by memory:
+
+- The high scores file is decoded incrementally, one score object at a time.
+- Imported rows are validated one at a time and only the best 50 are kept while reading.
+
+CSV files have a header row with the columns id, name and time. The id column is optional on import,
+because the imported scores are renumbered. A score is identified by its name and time, so importing
+an export of the current high scores does not add them again.
+"""
+import codecs
+import csv
+import heapq
+import io
+import json
+from itertools import chain
+import player_stats
+
+# Export and import formats and their content types
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Number of high scores kept on the leaderboard
+MAX_HIGH_SCORES = 50
+
+# Number of rows encoded per chunk of an export
+EXPORT_CHUNK_ROWS = 1000
+
+def iter_high_scores(path, chunk_size=65536):
+    """
+    Decode the scores of a high scores file one at a time without loading the whole list.
+
+    Args:
+        path (str): The path of the high scores file, a JSON list of score objects.
+        chunk_size (int, optional): The number of characters read at a time. Defaults to 65536.
+
+    Yields:
+        dict: The high score dictionaries in file order.
+
+    Raises:
+        ValueError: If the file is not a JSON list of objects.
+
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} is not a JSON list")
+        position = 1
+        while True:
+            # Skip the whitespace and the comma between objects
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                score, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The object continues in the next chunk
+                more = f.read(chunk_size)
+                if not more:
+                    raise ValueError(f"{path} ends in the middle of a score")
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield score
+            position = end
+
+def export_chunks(scores, fmt):
+    """
+    Encode scores as CSV or NDJSON text in chunks.
+
+    Args:
+        scores (iterable): The high score dictionaries to export.
+        fmt (str): The export format, 'csv' or 'ndjson'.
+
+    Yields:
+        str: Chunks of the encoded export.
+
+    """
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "name", "time"])
+    rows = 0
+    for score in scores:
+        if fmt == "csv":
+            writer.writerow([score.get('id'), score['name'], score['time']])
+        else:
+            buffer.write(json.dumps({'id': score.get('id'), 'name': score['name'], 'time': score['time']}) + "\n")
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_lines(stream, chunk_size=65536):
+    """
+    Read UTF-8 text lines from a binary stream, such as a request body, one chunk at a time.
+
+    Args:
+        stream: A file-like object with a read(size) method returning bytes.
+        chunk_size (int, optional): The number of bytes read at a time. Defaults to 65536.
+
+    Yields:
+        str: The lines of the stream, with their line endings.
+
+    Raises:
+        UnicodeDecodeError: If the stream is not valid UTF-8.
+
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        pending += decoder.decode(chunk, final=not chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+        if not chunk:
+            break
+    if pending:
+        yield pending
+
+def parse_rows(lines, fmt):
+    """
+    Parse the rows of a CSV or NDJSON import.
+
+    Args:
+        lines (iterable): The lines of the import.
+        fmt (str): The import format, 'csv' or 'ndjson'.
+
+    Yields:
+        dict | None: The parsed row, or None if the line could not be parsed.
+
+    """
+    if fmt == "csv":
+        for row in csv.DictReader(lines):
+            yield row
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            yield None
+            continue
+        yield row if isinstance(row, dict) else None
+
+def validate_row(row):
+    """
+    Check that an imported row is a valid high score.
+
+    Args:
+        row (dict): The parsed row.
+
+    Returns:
+        dict: A high score dictionary with 'name' and 'time' fields, or None if the row is not valid.
+
+    """
+    if row is None:
+        return None
+    name = row.get('name')
+    time = row.get('time')
+    if not player_stats.is_valid_score(name, time):
+        return None
+    return {'name': name, 'time': time}
+
+def best_unique_scores(scores, limit=MAX_HIGH_SCORES):
+    """
+    Keep the best scores, dropping repeats of a name and time that was already seen.
+
+    At most twice the limit of scores are kept in memory at a time.
+
+    Args:
+        scores (iterable): The high score dictionaries.
+        limit (int, optional): The number of scores to keep. Defaults to 50.
+
+    Returns:
+        list: The best scores sorted by time. Of equal times, the one seen first comes first.
+
+    """
+    best = {}
+    for score in scores:
+        best.setdefault((score['name'], score['time']), score)
+        if len(best) >= 2 * limit:
+            best = {key: best[key] for key in heapq.nsmallest(limit, best, key=lambda key: best[key]['time'])}
+    return heapq.nsmallest(limit, best.values(), key=lambda score: score['time'])
+
+def best_imported_scores(lines, fmt, counts, progress=None, progress_every=100000):
+    """
+    Validate the rows of an import and keep the best scores.
+
+    Only the best 50 distinct valid rows are kept in memory while the rows are read, as the rest could never
+    make it to the leaderboard.
+
+    Args:
+        lines (iterable): The lines of the import.
+        fmt (str): The import format, 'csv' or 'ndjson'.
+        counts (dict): Updated with the number of 'rows' read and 'rejected' rows.
+        progress (callable, optional): Called with the counts every 'progress_every' rows. Defaults to None.
+        progress_every (int, optional): The number of rows between progress reports. Defaults to 100000.
+
+    Returns:
+        list: The best valid scores, sorted by time.
+
+    """
+    counts.setdefault('rows', 0)
+    counts.setdefault('rejected', 0)
+
+    def valid_scores():
+        for row in parse_rows(lines, fmt):
+            counts['rows'] += 1
+            score = validate_row(row)
+            if score is None:
+                counts['rejected'] += 1
+            else:
+                yield score
+            if progress and counts['rows'] % progress_every == 0:
+                progress(counts)
+
+    return best_unique_scores(valid_scores())
+
+def merge_scores(high_scores, new_scores, replace=False):
+    """
+    Merge new scores into the leaderboard, keeping the best 50 and renumbering them.
+
+    The scores on the leaderboard are kept as they are, also if some of them have the same name and time.
+    A new score is left out if its name and time are already on the leaderboard or in an earlier new score.
+    Of equal times, the scores on the leaderboard rank first.
+
+    Args:
+        high_scores (list): The current high score dictionaries.
+        new_scores (list): The scores to merge.
+        replace (bool, optional): If True, the new scores replace the leaderboard, e.g. when a backup
+            is restored. Defaults to False.
+
+    Returns:
+        tuple: The merged leaderboard sorted by time, with IDs starting from 1, and the number of new
+        scores on it.
+
+    """
+    if replace:
+        high_scores = []
+    seen = {(score['name'], score['time']) for score in high_scores}
+    unique_scores = []
+    for score in new_scores:
+        key = (score['name'], score['time'])
+        if key not in seen:
+            seen.add(key)
+            unique_scores.append(score)
+
+    # Tag the scores as old or new, the tag also puts the old scores first among equal times
+    tagged = chain(((score, False) for score in high_scores), ((score, True) for score in unique_scores))
+    best = heapq.nsmallest(MAX_HIGH_SCORES, tagged, key=lambda item: (item[0]['time'], item[1]))
+    merged = [score for score, _ in best]
+    for i, score in enumerate(merged):
+        score['id'] = i + 1
+    return merged, sum(1 for _, is_new in best if is_new)
@@ -0,0 +1,121 @@
+"""
+Startup benchmark module.
+
+This module measures how long the entry points of the project take to start. It runs each measurement in a fresh
+Python process:
+
+- Import time of 'hangman' and 'app' with 'python -X importtime', with the slowest top level imports.
+  Importing 'app' is what a Gunicorn worker does when it boots.
+- Time to first menu of the game, measured by starting 'python hangman.py' and choosing "3) Exit" right away.
+
+Run it with:
+
+    python startup_benchmark.py [--runs N]
+
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Directory of the project, the benchmark runs the entry points from here
+project_dir = os.path.dirname(os.path.abspath(__file__))
+
+def parse_importtime(output):
+    """
+    Parse the output of 'python -X importtime'.
+
+    Args:
+        output (str): The stderr output of the Python process.
+
+    Returns:
+        list: A list of (module, self_us, cumulative_us, depth) tuples in import order.
+
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+def measure_import(module):
+    """
+    Import a module in a fresh Python process with import time tracing enabled.
+
+    Args:
+        module (str): The name of the module to import.
+
+    Returns:
+        list: The parsed import times, see parse_importtime().
+
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=project_dir, capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr)
+
+def measure_first_menu():
+    """
+    Start the game and exit from the main menu right away.
+
+    Returns:
+        float: The wall clock time in seconds from starting the process until it exited.
+
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "hangman.py"], cwd=project_dir, input="3\n",
+                   capture_output=True, text=True, check=True)
+    return time.perf_counter() - start
+
+def report_import(module, runs, top):
+    """
+    Print the median import time of a module and its slowest direct imports.
+
+    Args:
+        module (str): The name of the module to import.
+        runs (int): The number of processes to measure.
+        top (int): The number of slowest direct imports to print.
+
+    """
+    totals = []
+    children = {}
+    for _ in range(runs):
+        # Nested imports are listed before the module that imported them
+        nested = []
+        for name, self_us, cumulative_us, depth in measure_import(module):
+            if depth == 1:
+                nested.append((name, cumulative_us))
+            elif depth == 0:
+                if name == module:
+                    totals.append(cumulative_us)
+                    for child, child_us in nested:
+                        children.setdefault(child, []).append(child_us)
+                nested = []
+
+    print(f"import {module}: {statistics.median(totals) / 1000:.1f} ms (median of {runs})")
+    slowest = sorted(children.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, times in slowest[:top]:
+        print(f"    {name}: {statistics.median(times) / 1000:.1f} ms")
+
+def main():
+    """
+    Parse the command line arguments and print the startup benchmark report.
+
+    """
+    parser = argparse.ArgumentParser(description="Measure the startup time of the game and the backend.")
+    parser.add_argument("--runs", type=int, default=5, help="number of processes per measurement")
+    parser.add_argument("--top", type=int, default=5, help="number of slowest imports to show")
+    args = parser.parse_args()
+
+    report_import("hangman", args.runs, args.top)
+    report_import("app", args.runs, args.top)
+    menu_times = [measure_first_menu() for _ in range(args.runs)]
+    print(f"python hangman.py to first menu: {statistics.median(menu_times) * 1000:.1f} ms (median of {args.runs})")
+
+if __name__ == '__main__':
+    main()
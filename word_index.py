@@ -0,0 +1,270 @@
+"""
+Word index module.
+
+This module scores the difficulty of the words in 'words.txt' and selects the words of a game by difficulty. The
+scores are computed once and stored in the 'words_index.json' cache file, together with the SHA-256 hash of the
+word list, so the index is only rebuilt when the word list (or the scoring version) changes.
+
+The difficulty of a word combines four features, each scaled to 0-1 over the word list:
+
+- Expected misses: the misses a player makes when guessing letters from the most to the least common letter
+  of the word list, until the word is solved. Weight 0.5.
+- Distinct letters: more different letters need more correct guesses. Weight 0.2.
+- Letter entropy: the Shannon entropy of the letters of the word, words with repeated letters are easier. Weight 0.2.
+- Shortness: short words reveal less per correct guess. Weight 0.1.
+
+The words are split into three equal tiers by difficulty (easy, medium and hard), so a word of a given tier can
+be picked in constant time.
+
+Run the precompute step with:
+
+    python word_index.py
+
+"""
+import hashlib
+import json
+import math
+import os
+import random
+from collections import Counter
+
+# Define the paths to the word list and the word index cache file
+words_file = "words.txt"
+word_index_file = "words_index.json"
+
+# Version of the scoring, bump it when the scoring changes so cached indexes are rebuilt
+INDEX_VERSION = 1
+
+# Weights of the difficulty features
+WEIGHTS = {"misses": 0.5, "distinct": 0.2, "entropy": 0.2, "shortness": 0.1}
+
+# Difficulty tiers from the easiest to the hardest
+TIERS = ["easy", "medium", "hard"]
+
+# Word selection modes of the game
+SELECTION_MODES = ["random", "balanced", "progressive"]
+
+def letters_of(word):
+    """
+    Get the letters of a word, leaving out spaces and hyphens which are revealed from the start.
+
+    Args:
+        word (str): The word.
+
+    Returns:
+        str: The letters of the word.
+
+    """
+    return "".join(char for char in word if char.isalpha())
+
+def expected_misses(word, guess_order):
+    """
+    Count the misses when the letters are guessed in a fixed order until the word is solved.
+
+    The count is not capped at the six misses allowed in the game, so words that would all be lost
+    with this strategy can still be told apart.
+
+    Args:
+        word (str): The word.
+        guess_order (list): The letters in the order they are guessed.
+
+    Returns:
+        int: The number of misses.
+
+    """
+    remaining = set(letters_of(word))
+    misses = 0
+    for letter in guess_order:
+        if not remaining:
+            break
+        if letter in remaining:
+            remaining.discard(letter)
+        else:
+            misses += 1
+    return misses
+
+def letter_entropy(word):
+    """
+    Compute the Shannon entropy of the letters of a word in bits.
+
+    Args:
+        word (str): The word.
+
+    Returns:
+        float: The entropy of the letter distribution.
+
+    """
+    letters = letters_of(word)
+    if not letters:
+        return 0.0
+    counts = Counter(letters)
+    return -sum(n / len(letters) * math.log2(n / len(letters)) for n in counts.values())
+
+def scale(values, invert=False):
+    """
+    Scale values linearly to the range 0-1.
+
+    Args:
+        values (list): The values to scale.
+        invert (bool, optional): If True, the smallest value becomes 1. Defaults to False.
+
+    Returns:
+        list: The scaled values. If all values are equal, they are all scaled to 0.
+
+    """
+    low, high = min(values), max(values)
+    if high == low:
+        return [0.0 for _ in values]
+    scaled = [(value - low) / (high - low) for value in values]
+    return [1 - value for value in scaled] if invert else scaled
+
+def build_word_index(words):
+    """
+    Score the difficulty of words and split them into tiers.
+
+    Args:
+        words (list): The words of the word list.
+
+    Returns:
+        dict: The index with a 'words' list of per-word features and scores, indexed by word ID,
+        and a 'tiers' dictionary mapping each tier to the IDs of its words.
+
+    """
+    # Guess letters from the most to the least common letter of the word list
+    frequencies = Counter("".join(letters_of(word) for word in words))
+    guess_order = [letter for letter, _ in frequencies.most_common()]
+
+    features = {
+        "misses": [expected_misses(word, guess_order) for word in words],
+        "distinct": [len(set(letters_of(word))) for word in words],
+        "entropy": [letter_entropy(word) for word in words],
+        "length": [len(letters_of(word)) for word in words],
+    }
+    scaled = {
+        "misses": scale(features["misses"]),
+        "distinct": scale(features["distinct"]),
+        "entropy": scale(features["entropy"]),
+        "shortness": scale(features["length"], invert=True),
+    }
+
+    entries = []
+    for i, word in enumerate(words):
+        difficulty = sum(weight * scaled[name][i] for name, weight in WEIGHTS.items())
+        entries.append({"id": i, "word": word, "length": features["length"][i],
+                        "distinct": features["distinct"][i], "entropy": round(features["entropy"][i], 4),
+                        "misses": features["misses"][i], "difficulty": round(difficulty, 4)})
+
+    # Split the words into equal tiers from the easiest to the hardest
+    ranked = sorted(range(len(words)), key=lambda i: entries[i]["difficulty"])
+    tiers = {tier: ranked[n * len(ranked) // len(TIERS):(n + 1) * len(ranked) // len(TIERS)]
+             for n, tier in enumerate(TIERS)}
+    return {"words": entries, "tiers": tiers}
+
+def read_words(path=words_file):
+    """
+    Read the word list and its hash.
+
+    Args:
+        path (str, optional): The path of the word list. Defaults to 'words.txt'.
+
+    Returns:
+        tuple: The list of words, one per line, and the SHA-256 hash of the file.
+
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    words = [line.strip() for line in data.decode('utf-8').splitlines()]
+    return words, hashlib.sha256(data).hexdigest()
+
+def load_word_index(path=words_file, index_path=word_index_file):
+    """
+    Load the word index from the cache file, rebuilding it if the word list or the scoring has changed.
+
+    A cache file that can't be read is rebuilt, and if the cache file can't be written, the rebuilt
+    index is used without caching it.
+
+    Args:
+        path (str, optional): The path of the word list. Defaults to 'words.txt'.
+        index_path (str, optional): The path of the cache file. Defaults to 'words_index.json'.
+
+    Returns:
+        dict: The word index, see build_word_index().
+
+    """
+    words, words_hash = read_words(path)
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        if (isinstance(index, dict) and index.get("words_hash") == words_hash
+                and index.get("version") == INDEX_VERSION):
+            return index
+    except (OSError, ValueError):
+        # There is no cache file yet, or it is corrupt
+        pass
+
+    # The word list or the scoring has changed, so score the words again and update the cache
+    index = build_word_index(words)
+    index["version"] = INDEX_VERSION
+    index["words_hash"] = words_hash
+    temp_file = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump(index, f, indent=4)
+        os.replace(temp_file, index_path)
+    except OSError:
+        # The game can be played without the cache, the index is built again next time
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    return index
+
+def select_words(index, mode="balanced", rounds=3):
+    """
+    Pick the words of a game.
+
+    Args:
+        index (dict): The word index, see load_word_index().
+        mode (str, optional): How the words are picked. Defaults to 'balanced'.
+            'random' picks any words, 'balanced' picks one word from each tier in random order, so every
+            game is about as hard, and 'progressive' picks words from the easiest to the hardest tier.
+        rounds (int, optional): The number of words to pick. Defaults to 3.
+
+    Returns:
+        list: The IDs of the picked words.
+
+    Raises:
+        ValueError: If the mode is not one of SELECTION_MODES.
+
+    """
+    if mode not in SELECTION_MODES:
+        raise ValueError(f"Unknown word selection mode: {mode}")
+    tiers = [index["tiers"][tier] for tier in TIERS]
+    if mode == "random" or not all(tiers):
+        return random.sample(range(len(index["words"])), rounds)
+
+    # Spread the rounds over the tiers from the easiest to the hardest
+    tier_of_round = [n * len(TIERS) // rounds for n in range(rounds)]
+    word_ids = []
+    for tier in tier_of_round:
+        word_id = random.choice(tiers[tier])
+        # Pick again if the word was already picked for this game
+        while word_id in word_ids and len(tiers[tier]) > tier_of_round.count(tier):
+            word_id = random.choice(tiers[tier])
+        word_ids.append(word_id)
+    if mode == "balanced":
+        random.shuffle(word_ids)
+    return word_ids
+
+def main():
+    """
+    Rebuild the word index if needed and print the words of each tier.
+
+    """
+    index = load_word_index()
+    for tier in TIERS:
+        words = [index["words"][i] for i in index["tiers"][tier]]
+        print(f"{tier.capitalize()} ({len(words)} words):")
+        for entry in words:
+            print(f" - {entry['word']}: difficulty {entry['difficulty']}, {entry['misses']} expected misses")
+
+if __name__ == '__main__':
+    main()